@@ -0,0 +1,585 @@
+#!/usr/bin/env python3
+"""
+End-to-end ETL benchmark with recorded fixtures and optional profiling.
+- Serves the HTML fixtures in bench_fixtures/html and a stub LLM endpoint from
+  a local HTTP server, so no stage touches Wikipedia or a model provider
+- Imports the real openai.py with a generated config.yaml that points it at the
+  stub endpoint, so the stages never read the repo's config.yaml
+- Drives graph_ingest.ingest() against an in-process mock Neo4j driver that
+  counts session.run calls (optionally with a simulated round-trip latency)
+- Measures each hot path of the real scripts: HTTP fetch, scrape_article
+  parsing, save_to_catalog rewrites, is_relevant keyword scanning, call_llm
+  round trips and per-row session.run ingestion
+- Writes machine-readable JSON; --compare flags metrics that regressed
+  against a previous run beyond --threshold, and stages the baseline measured
+  that are now skipped (exit code 1)
+- --profile DIR writes per-stage cProfile output (.prof + top functions) or,
+  with --profiler sample, folded stacks from a wall-clock sampler that
+  flamegraph.pl / speedscope can render
+
+Usage:
+  python bench_etl.py [--stages parse llm ...] [--repeat 5] [--out bench_results.json]
+  python bench_etl.py --profile profiles [--profiler sample]
+  python bench_etl.py --compare baseline.json [--threshold 0.15]
+  python bench_etl.py --record https://en.wikipedia.org/wiki/Vishnu [...]
+"""
+
+import argparse
+import contextlib
+import cProfile
+import csv
+import importlib.util
+import io
+import json
+import os
+import platform
+import pstats
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+from collections import Counter
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+from urllib.parse import unquote
+
+import requests
+import yaml
+
+ETL_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURES_DIR = os.path.join(ETL_DIR, 'bench_fixtures')
+HTML_DIR = os.path.join(FIXTURES_DIR, 'html')
+LLM_RESPONSE_JSON = os.path.join(FIXTURES_DIR, 'llm_response.json')
+ENRICHED_CSV = os.path.join(ETL_DIR, 'enriched.csv')
+RESULTS_JSON = 'bench_results.json'
+RESULTS_VERSION = 1
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.15
+CATALOG_ROWS = 500  # save_to_catalog calls per repeat
+RELEVANCE_CHECKS = 20000  # is_relevant calls per repeat
+LLM_CALLS = 20  # call_llm round trips per repeat
+SAMPLE_INTERVAL = 0.001
+
+# Local fixture server: GET /wiki/<name> serves bench_fixtures/html/<name>.html,
+# POST to any path answers like the chat-completions and Gemini endpoints.
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        name = unquote(self.path.split('/wiki/', 1)[-1].split('#', 1)[0])
+        path = os.path.join(HTML_DIR, f"{os.path.basename(name)}.html")
+        if not os.path.exists(path):
+            self.send_error(404)
+            return
+        with open(path, 'rb') as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=UTF-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.server.llm_calls += 1
+        if self.server.llm_latency:
+            time.sleep(self.server.llm_latency)
+        text = '```json\n' + self.server.llm_response + '\n```'
+        # One payload that satisfies both response shapes ask_model understands
+        body = json.dumps({
+            'choices': [{'message': {'content': text}}],
+            'candidates': [{'content': {'parts': [{'text': text}]}}],
+        }).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+@contextlib.contextmanager
+def fixture_server(llm_latency_ms=0):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+    server.daemon_threads = True
+    server.llm_calls = 0
+    server.llm_latency = llm_latency_ms / 1000.0
+    with open(LLM_RESPONSE_JSON, 'r', encoding='utf-8') as f:
+        server.llm_response = f.read().strip()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield server, f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+@contextlib.contextmanager
+def fixture_openai(base_url):
+    """
+    Make the real openai.py the 'openai' module, loaded from a temporary copy
+    whose config.yaml points it at the fixture server.
+    """
+    with tempfile.TemporaryDirectory(prefix='bench_openai_') as tmp:
+        shutil.copy(os.path.join(ETL_DIR, 'openai.py'), tmp)
+        config = {
+            'use_model': 'github_models',
+            'github_models': {'endpoint': base_url + '/llm', 'token': 'bench', 'default_model': 'bench'},
+        }
+        with open(os.path.join(tmp, 'config.yaml'), 'w', encoding='utf-8') as f:
+            yaml.safe_dump(config, f)
+        spec = importlib.util.spec_from_file_location('openai', os.path.join(tmp, 'openai.py'))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        # Also drops the modules that imported it once the benchmarks are done
+        with mock.patch.dict(sys.modules, {'openai': module}):
+            yield module
+
+# Mock Neo4j driver
+
+class MockSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    def run(self, cypher, **params):
+        self.driver.runs += 1
+        if self.driver.latency:
+            time.sleep(self.driver.latency)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+class MockDriver:
+    def __init__(self, latency):
+        self.runs = 0
+        self.latency = latency
+
+    def session(self):
+        return MockSession(self)
+
+    def close(self):
+        pass
+
+class MockGraphDatabase:
+    latency = 0.0
+    last_driver = None
+
+    @classmethod
+    def driver(cls, uri, auth=None):
+        cls.last_driver = MockDriver(cls.latency)
+        return cls.last_driver
+
+def import_graph_ingest():
+    try:
+        import graph_ingest
+    except ImportError as e:
+        if e.name != 'neo4j':
+            raise
+        # The benchmark only ever talks to MockGraphDatabase, so the real
+        # driver package is not needed to measure graph_ingest's own overhead
+        sys.modules['neo4j'] = types.ModuleType('neo4j')
+        sys.modules['neo4j'].GraphDatabase = MockGraphDatabase
+        import graph_ingest
+    return graph_ingest
+
+# Helpers
+
+def fixture_names():
+    return sorted(f[:-len('.html')] for f in os.listdir(HTML_DIR) if f.endswith('.html'))
+
+class FakeResponse:
+    status_code = 200
+
+    def __init__(self, content):
+        self.content = content
+
+def rate(count, seconds):
+    return round(count / seconds, 2) if seconds else None
+
+def ms(seconds, count):
+    return round(seconds * 1000 / count, 3) if count else None
+
+# Stages. Each runs in its own temporary working directory and returns metrics.
+
+def bench_http(ctx):
+    """Fetch cost alone: requests.get against the local fixture server."""
+    names = fixture_names()
+    pages = 0
+    start = time.perf_counter()
+    for _ in range(ctx['repeat']):
+        for name in names:
+            requests.get(f"{ctx['base_url']}/wiki/{name}", timeout=10)
+            pages += 1
+    elapsed = time.perf_counter() - start
+    return {'pages': pages, 'pages_per_sec': rate(pages, elapsed), 'fetch_ms_per_page': ms(elapsed, pages)}
+
+def bench_parse(ctx):
+    """scrape_article with the fetch and catalog write stubbed out: BeautifulSoup parsing + link extraction + text write."""
+    import scrapeWikipedia
+    contents = []
+    for name in fixture_names():
+        with open(os.path.join(HTML_DIR, f"{name}.html"), 'rb') as f:
+            contents.append((name, f.read()))
+    pages = 0
+    links = 0
+    elapsed = 0.0
+    with mock.patch.object(scrapeWikipedia, 'save_to_catalog'):
+        for _ in range(ctx['repeat']):
+            for name, content in contents:
+                with mock.patch.object(scrapeWikipedia.requests, 'get', return_value=FakeResponse(content)):
+                    start = time.perf_counter()
+                    links += len(scrapeWikipedia.scrape_article(f"{ctx['base_url']}/wiki/{name}", set()))
+                    elapsed += time.perf_counter() - start
+                pages += 1
+    return {
+        'pages': pages,
+        'parse_ms_per_page': ms(elapsed, pages),
+        'pages_per_sec': rate(pages, elapsed),
+        'links_per_page': round(links / pages, 1) if pages else None,
+    }
+
+def bench_scrape(ctx):
+    """Full scrape_article over local HTTP, including the catalog append."""
+    import scrapeWikipedia
+    names = fixture_names()
+    pages = 0
+    start = time.perf_counter()
+    for _ in range(ctx['repeat']):
+        for name in names:
+            scrapeWikipedia.scrape_article(f"{ctx['base_url']}/wiki/{name}", set())
+            pages += 1
+    elapsed = time.perf_counter() - start
+    return {'pages': pages, 'pages_per_sec': rate(pages, elapsed), 'ms_per_page': ms(elapsed, pages)}
+
+def bench_catalog(ctx):
+    """save_to_catalog re-reads the whole CSV per row; report early vs late per-row cost to expose the growth."""
+    import scrapeWikipedia
+    rows = CATALOG_ROWS * ctx['repeat']
+    window = max(1, rows // 10)
+    first = last = 0.0
+    start = time.perf_counter()
+    for i in range(rows):
+        t = time.perf_counter()
+        scrapeWikipedia.save_to_catalog(f"Article {i}", f"https://en.wikipedia.org/wiki/Article_{i}")
+        dt = time.perf_counter() - t
+        if i < window:
+            first += dt
+        elif i >= rows - window:
+            last += dt
+    elapsed = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'rows_per_sec': rate(rows, elapsed),
+        'first_rows_ms_per_row': ms(first, window),
+        'last_rows_ms_per_row': ms(last, window),
+    }
+
+def bench_relevance(ctx):
+    """is_relevant keyword scanning over enriched titles/urls (mix of hits and misses)."""
+    from filter_hinduism_links import is_relevant
+    rows = []
+    with open(ENRICHED_CSV, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            rows.append((row['title'], row['url']))
+    rows += [(f"Unrelated topic {i}", f"https://en.wikipedia.org/wiki/Unrelated_{i}") for i in range(len(rows))]
+    checks = RELEVANCE_CHECKS * ctx['repeat']
+    hits = 0
+    start = time.perf_counter()
+    for i in range(checks):
+        title, url = rows[i % len(rows)]
+        hits += is_relevant(title, url)
+    elapsed = time.perf_counter() - start
+    return {'checks': checks, 'checks_per_sec': rate(checks, elapsed), 'hit_rate': round(hits / checks, 3)}
+
+def bench_llm(ctx):
+    """enrichment.call_llm round trips against the stub endpoint (prompt build, HTTP, JSON parse)."""
+    import enrichment
+    names = fixture_names()
+    texts = []
+    for name in names:
+        with open(os.path.join(HTML_DIR, f"{name}.html"), 'r', encoding='utf-8') as f:
+            texts.append(f.read())
+    calls = LLM_CALLS * ctx['repeat']
+    failures = 0
+    server = ctx['server']
+    before = server.llm_calls
+    start = time.perf_counter()
+    for i in range(calls):
+        if not enrichment.call_llm(texts[i % len(texts)]):
+            failures += 1
+    elapsed = time.perf_counter() - start
+    return {
+        'calls': server.llm_calls - before,
+        'llm_calls_per_sec': rate(calls, elapsed),
+        'ms_per_call': ms(elapsed, calls),
+        'stub_latency_ms': ctx['llm_latency_ms'],
+        'failures': failures,
+    }
+
+def bench_ingest(ctx):
+    """graph_ingest.ingest() over enriched.csv (repeated) with the mock driver."""
+    graph_ingest = import_graph_ingest()
+    with open(ENRICHED_CSV, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        fieldnames = reader.fieldnames
+        source_rows = list(reader)
+    path = os.path.abspath('enriched_bench.csv')
+    edges = 0
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames)
+        writer.writeheader()
+        for _ in range(ctx['repeat']):
+            for row in source_rows:
+                writer.writerow(row)
+                relationships = graph_ingest.safe_parse(row.get('relationships', '[]'))
+                if isinstance(relationships, list):
+                    edges += sum(1 for rel in relationships if isinstance(rel, dict))
+    rows = len(source_rows) * ctx['repeat']
+    MockGraphDatabase.latency = ctx['neo4j_latency_ms'] / 1000.0
+    with mock.patch.object(graph_ingest, 'GraphDatabase', MockGraphDatabase), \
+         mock.patch.object(graph_ingest, 'ENRICHED_CSV', path):
+        start = time.perf_counter()
+        graph_ingest.ingest()
+        elapsed = time.perf_counter() - start
+    runs = MockGraphDatabase.last_driver.runs
+    return {
+        'rows': rows,
+        'edges': edges,
+        'session_runs': runs,
+        'rows_per_sec': rate(rows, elapsed),
+        'edges_per_sec': rate(edges, elapsed),
+        'session_runs_per_sec': rate(runs, elapsed),
+        'simulated_run_latency_ms': ctx['neo4j_latency_ms'],
+    }
+
+STAGES = {
+    'http': bench_http,
+    'parse': bench_parse,
+    'scrape': bench_scrape,
+    'catalog': bench_catalog,
+    'relevance': bench_relevance,
+    'llm': bench_llm,
+    'ingest': bench_ingest,
+}
+
+# Profiling
+
+class StackSampler:
+    """Wall-clock sampler of one thread's stack, aggregated as folded stacks (py-spy --format raw style)."""
+
+    def __init__(self, thread_id, interval=SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+@contextlib.contextmanager
+def profiled(name, profile_dir, profiler):
+    if not profile_dir:
+        yield
+        return
+    os.makedirs(profile_dir, exist_ok=True)
+    if profiler == 'sample':
+        sampler = StackSampler(threading.get_ident())
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            sampler.write(os.path.join(profile_dir, f"{name}.folded"))
+        return
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        prof.dump_stats(os.path.join(profile_dir, f"{name}.prof"))
+        out = io.StringIO()
+        pstats.Stats(prof, stream=out).sort_stats('cumulative').print_stats(30)
+        with open(os.path.join(profile_dir, f"{name}.txt"), 'w', encoding='utf-8') as f:
+            f.write(out.getvalue())
+
+# Running and comparing
+
+def run_stage(name, ctx, profile_dir=None, profiler='cprofile'):
+    prev_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix=f"bench_{name}_") as workdir:
+        os.chdir(workdir)
+        try:
+            # The scripts print per page/row; keep that out of the timings and the report
+            with contextlib.redirect_stdout(io.StringIO()), profiled(name, profile_dir, profiler):
+                start = time.perf_counter()
+                metrics = STAGES[name](ctx)
+                seconds = time.perf_counter() - start
+        except Exception as e:
+            return {'skipped': f"{type(e).__name__}: {' '.join(str(e).split())}"}
+        finally:
+            os.chdir(prev_cwd)
+    return {'seconds': round(seconds, 4), 'metrics': metrics}
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ETL_DIR, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+def run_benchmarks(stages, repeat, llm_latency_ms, neo4j_latency_ms, profile_dir=None, profiler='cprofile'):
+    if ETL_DIR not in sys.path:
+        sys.path.insert(0, ETL_DIR)
+    # Stages run in temporary working directories
+    profile_dir = os.path.abspath(profile_dir) if profile_dir else None
+    results = {
+        'version': RESULTS_VERSION,
+        'timestamp': datetime.now().isoformat(),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'config': {
+            'repeat': repeat,
+            'fixtures': fixture_names(),
+            'llm_latency_ms': llm_latency_ms,
+            'neo4j_latency_ms': neo4j_latency_ms,
+        },
+        'stages': {},
+    }
+    with fixture_server(llm_latency_ms) as (server, base_url), fixture_openai(base_url):
+        ctx = {
+            'server': server,
+            'base_url': base_url,
+            'repeat': repeat,
+            'llm_latency_ms': llm_latency_ms,
+            'neo4j_latency_ms': neo4j_latency_ms,
+        }
+        for name in stages:
+            results['stages'][name] = run_stage(name, ctx, profile_dir, profiler)
+    return results
+
+def metric_direction(name):
+    """+1 if higher is better, -1 if lower is better, 0 for informational metrics."""
+    if name.endswith('_per_sec'):
+        return 1
+    if (name.startswith('ms_') or '_ms' in name) and not name.startswith(('stub_', 'simulated_')):
+        return -1
+    return 0
+
+def compare(results, baseline, threshold):
+    """
+    List of (stage, metric, old, new, change) that regressed by more than
+    threshold. A stage the baseline measured that is now skipped is listed as
+    (stage, 'skipped', None, reason, None).
+    """
+    regressions = []
+    for stage, current in results['stages'].items():
+        previous = baseline.get('stages', {}).get(stage)
+        if not previous or 'metrics' not in previous:
+            continue
+        if 'metrics' not in current:
+            regressions.append((stage, 'skipped', None, current.get('skipped'), None))
+            continue
+        for metric, new in current['metrics'].items():
+            old = previous['metrics'].get(metric)
+            direction = metric_direction(metric)
+            if not direction or not isinstance(old, (int, float)) or not isinstance(new, (int, float)) or not old:
+                continue
+            change = (new - old) / old
+            if change * direction < -threshold:
+                regressions.append((stage, metric, old, new, change))
+    return regressions
+
+def print_summary(results):
+    for stage, result in results['stages'].items():
+        if 'skipped' in result:
+            print(f"{stage:<10} skipped: {result['skipped']}")
+            continue
+        metrics = ', '.join(f"{k}={v}" for k, v in result['metrics'].items())
+        print(f"{stage:<10} {result['seconds']:>8.3f}s  {metrics}")
+
+def record_fixtures(urls):
+    """Save live pages into bench_fixtures/html (one-off; benchmarks never hit the network)."""
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/116.0.0.0 Safari/537.36'
+    }
+    os.makedirs(HTML_DIR, exist_ok=True)
+    for url in urls:
+        resp = requests.get(url, headers=headers, timeout=10)
+        if resp.status_code != 200:
+            print(f"Failed to fetch {url} (status {resp.status_code})")
+            continue
+        name = os.path.basename(unquote(url.split('#', 1)[0].rstrip('/')))
+        path = os.path.join(HTML_DIR, f"{name}.html")
+        with open(path, 'wb') as f:
+            f.write(resp.content)
+        print(f"Recorded {url} -> {path}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the ETL hot paths against local fixtures.')
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='Workload multiplier per stage')
+    parser.add_argument('--out', default=RESULTS_JSON, help='Where to write the JSON results')
+    parser.add_argument('--profile', metavar='DIR', help='Write per-stage profiles to DIR')
+    parser.add_argument('--profiler', choices=['cprofile', 'sample'], default='cprofile')
+    parser.add_argument('--compare', metavar='BASELINE', help='Previous results JSON to check for regressions')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Relative change that counts as a regression (default 0.15)')
+    parser.add_argument('--llm-latency-ms', type=float, default=0, help='Delay the stub LLM adds per call')
+    parser.add_argument('--neo4j-latency-ms', type=float, default=0, help='Delay the mock driver adds per session.run')
+    parser.add_argument('--record', nargs='+', metavar='URL', help='Record live pages as HTML fixtures and exit')
+    args = parser.parse_args()
+
+    if args.record:
+        record_fixtures(args.record)
+        return
+    results = run_benchmarks(args.stages, args.repeat, args.llm_latency_ms, args.neo4j_latency_ms,
+                             args.profile, args.profiler)
+    print_summary(results)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.out}")
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        for stage, metric, old, new, change in regressions:
+            if change is None:
+                print(f"REGRESSION {stage}: measured in {args.compare}, now skipped ({new})")
+            else:
+                print(f"REGRESSION {stage}.{metric}: {old} -> {new} ({change:+.1%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.threshold:.0%} against {args.compare}")
+
+if __name__ == "__main__":
+    main()
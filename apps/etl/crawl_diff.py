@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Bounded-memory diff of two crawl catalogs (links CSVs written by the scrapers).
+- Exact mode: external sort-merge on url. Each catalog is sorted in chunks to
+  temporary run files, and the runs are merged, so memory stays at one chunk
+  however large the catalogs get
+- Reports added/removed/common URLs, changed titles and, when the article
+  directories are given, article content-hash changes
+- Writes delta lists in the catalog schema (Serial no,title,url,timestamp) for
+  an incremental refresh:
+    python scrapeWikipedia.py --recrawl-file DELTA/recrawl_urls.txt
+  fetches the added and changed urls again into articles/ (without following
+  their links), then
+    python enrichment.py --upsert --articles articles --links DELTA/added.csv DELTA/changed.csv --remove DELTA/removed.csv
+  re-enriches those rows from the fresh text and updates enriched.csv in place.
+  The pipeline's combine stage copies the refreshed articles into all_articles/
+  for search_index.py
+- Approximate mode: HyperLogLog cardinalities and a bottom-k MinHash Jaccard
+  estimate in a single pass with fixed-size sketches (counts only, no deltas)
+
+Usage:
+  python crawl_diff.py OLD.csv NEW.csv [--old-articles DIR] [--new-articles DIR] [--delta-dir DIR]
+  python crawl_diff.py OLD.csv NEW.csv --approx
+"""
+
+import argparse
+import csv
+import hashlib
+import heapq
+import json
+import math
+import os
+import tempfile
+from itertools import groupby
+
+CHUNK_SIZE = 200000  # Catalog rows held in memory per sorted run
+HLL_PRECISION = 14  # 2**14 registers, ~0.8% standard error
+MINHASH_K = 1024
+CATALOG_FIELDS = ['Serial no', 'title', 'url', 'timestamp']
+
+def clean_filename(title):
+    return "".join(c if c.isalnum() or c in (' ', '_') else '_' for c in title).rstrip()
+
+def article_hash(articles_dir, title):
+    """sha1 of the scraped article text, or '' if there is no article file."""
+    if not articles_dir:
+        return ''
+    path = os.path.join(articles_dir, f"{clean_filename(title)}_clean.txt")
+    if not os.path.exists(path):
+        return ''
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def read_catalog(csv_file, articles_dir=None):
+    """Stream [url, title, content_hash, serial, timestamp] records from a links CSV."""
+    with open(csv_file, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            url = row.get('url')
+            if not url:
+                continue
+            title = row.get('title') or ''
+            serial = row.get('Serial no', row.get('serial no', row.get('serial_no', '')))
+            yield [url, title, article_hash(articles_dir, title), serial, row.get('timestamp') or '']
+
+# Exact mode: external sort-merge
+
+def write_run(records, tmpdir, index):
+    records.sort(key=lambda r: r[0])
+    path = os.path.join(tmpdir, f"run_{index:05d}.jsonl")
+    with open(path, 'w', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    return path
+
+def read_run(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            yield json.loads(line)
+
+def sorted_catalog(records, tmpdir, prefix, chunk_size=CHUNK_SIZE):
+    """
+    Sort records by url with bounded memory, keeping the last row for duplicate urls.
+
+    Runs are written in input order and both sort and merge are stable, so
+    within a group of equal urls the last record is the latest catalog row.
+    """
+    run_dir = tempfile.mkdtemp(prefix=prefix, dir=tmpdir)
+    runs = []
+    chunk = []
+    for record in records:
+        chunk.append(record)
+        if len(chunk) >= chunk_size:
+            runs.append(write_run(chunk, run_dir, len(runs)))
+            chunk = []
+    if chunk:
+        runs.append(write_run(chunk, run_dir, len(runs)))
+    del chunk
+    merged = heapq.merge(*(read_run(p) for p in runs), key=lambda r: r[0])
+    for _, group in groupby(merged, key=lambda r: r[0]):
+        for record in group:
+            pass
+        yield record
+
+def merge_diff(old_records, new_records):
+    """Merge-join two url-sorted streams, yielding (status, old, new)."""
+    old = next(old_records, None)
+    new = next(new_records, None)
+    while old is not None or new is not None:
+        if new is None or (old is not None and old[0] < new[0]):
+            yield 'removed', old, None
+            old = next(old_records, None)
+        elif old is None or new[0] < old[0]:
+            yield 'added', None, new
+            new = next(new_records, None)
+        else:
+            yield 'common', old, new
+            old = next(old_records, None)
+            new = next(new_records, None)
+
+class DeltaWriter:
+    """Delta CSVs in the catalog schema plus a plain url list for re-crawling."""
+
+    def __init__(self, delta_dir):
+        os.makedirs(delta_dir, exist_ok=True)
+        self.files = []
+        self.writers = {}
+        for name in ['added', 'removed', 'changed']:
+            f = open(os.path.join(delta_dir, f"{name}.csv"), 'w', newline='', encoding='utf-8')
+            writer = csv.writer(f)
+            writer.writerow(CATALOG_FIELDS + (['change'] if name == 'changed' else []))
+            self.files.append(f)
+            self.writers[name] = writer
+        self.recrawl = open(os.path.join(delta_dir, 'recrawl_urls.txt'), 'w', encoding='utf-8')
+        self.files.append(self.recrawl)
+
+    def write(self, name, record, change=None):
+        url, title, _, serial, timestamp = record
+        self.writers[name].writerow([serial, title, url, timestamp] + ([change] if change else []))
+        if name in ('added', 'changed'):
+            self.recrawl.write(url + '\n')
+
+    def close(self):
+        for f in self.files:
+            f.close()
+
+def diff_catalogs(old_csv, new_csv, old_articles=None, new_articles=None, delta_dir=None,
+                  chunk_size=CHUNK_SIZE, tmpdir=None):
+    """
+    Exact diff of two catalogs by url.
+
+    Returns:
+        dict: counts for old, new, common, added, removed, title_changed, content_changed.
+    """
+    stats = dict.fromkeys(['old', 'new', 'common', 'added', 'removed', 'title_changed', 'content_changed'], 0)
+    delta = DeltaWriter(delta_dir) if delta_dir else None
+    try:
+        with tempfile.TemporaryDirectory(prefix='crawl_diff_', dir=tmpdir) as work:
+            old_sorted = sorted_catalog(read_catalog(old_csv, old_articles), work, 'old_', chunk_size)
+            new_sorted = sorted_catalog(read_catalog(new_csv, new_articles), work, 'new_', chunk_size)
+            for status, old, new in merge_diff(old_sorted, new_sorted):
+                if status == 'removed':
+                    stats['old'] += 1
+                    stats['removed'] += 1
+                    if delta:
+                        delta.write('removed', old)
+                    continue
+                stats['new'] += 1
+                if status == 'added':
+                    stats['added'] += 1
+                    if delta:
+                        delta.write('added', new)
+                    continue
+                stats['old'] += 1
+                stats['common'] += 1
+                changes = []
+                if old[1] != new[1]:
+                    stats['title_changed'] += 1
+                    changes.append('title')
+                # Only compare content when both sides have an article file
+                if old[2] and new[2] and old[2] != new[2]:
+                    stats['content_changed'] += 1
+                    changes.append('content')
+                if changes and delta:
+                    delta.write('changed', new, '+'.join(changes))
+    finally:
+        if delta:
+            delta.close()
+    return stats
+
+# Approximate mode: HyperLogLog + bottom-k MinHash
+
+def url_hash(url):
+    return int.from_bytes(hashlib.sha1(url.encode('utf-8')).digest()[:8], 'big')
+
+class HyperLogLog:
+    def __init__(self, precision=HLL_PRECISION):
+        self.p = precision
+        self.m = 1 << precision
+        self.registers = bytearray(self.m)
+
+    def add_hash(self, h):
+        idx = h >> (64 - self.p)
+        rest = h & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[idx]:
+            self.registers[idx] = rank
+
+    def merge(self, other):
+        merged = HyperLogLog(self.p)
+        merged.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+        return merged
+
+    def count(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction (linear counting)
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+class BottomK:
+    """The k smallest distinct url hashes: a one-permutation MinHash sketch."""
+
+    def __init__(self, k=MINHASH_K):
+        self.k = k
+        self.heap = []  # Negated hashes, so heap[0] is the largest kept hash
+        self.members = set()
+
+    def add_hash(self, h):
+        if h in self.members:
+            return
+        if len(self.heap) < self.k:
+            heapq.heappush(self.heap, -h)
+            self.members.add(h)
+        elif h < -self.heap[0]:
+            removed = -heapq.heappushpop(self.heap, -h)
+            self.members.discard(removed)
+            self.members.add(h)
+
+    def jaccard(self, other):
+        union = heapq.nsmallest(self.k, self.members | other.members)
+        if not union:
+            return 0.0
+        both = sum(1 for h in union if h in self.members and h in other.members)
+        return both / len(union)
+
+def sketch_catalog(csv_file):
+    hll = HyperLogLog()
+    minhash = BottomK()
+    for url, *_ in read_catalog(csv_file):
+        h = url_hash(url)
+        hll.add_hash(h)
+        minhash.add_hash(h)
+    return hll, minhash
+
+def approx_diff(old_csv, new_csv):
+    old_hll, old_mh = sketch_catalog(old_csv)
+    new_hll, new_mh = sketch_catalog(new_csv)
+    old_count = old_hll.count()
+    new_count = new_hll.count()
+    union = old_hll.merge(new_hll).count()
+    common = max(0, old_count + new_count - union)
+    return {
+        'old': old_count,
+        'new': new_count,
+        'common': common,
+        'added': max(0, union - old_count),
+        'removed': max(0, union - new_count),
+        'jaccard': round(old_mh.jaccard(new_mh), 4),
+    }
+
+def print_report(old_csv, new_csv, stats, approx=False):
+    mark = '~' if approx else ''
+    print(f"Total URLs in {old_csv}: {mark}{stats['old']}")
+    print(f"Total URLs in {new_csv}: {mark}{stats['new']}")
+    print(f"Common URLs: {mark}{stats['common']}")
+    print(f"Added URLs: {mark}{stats['added']}")
+    print(f"Removed URLs: {mark}{stats['removed']}")
+    if 'title_changed' in stats:
+        print(f"Changed titles: {stats['title_changed']}")
+        print(f"Changed content: {stats['content_changed']}")
+    if 'jaccard' in stats:
+        print(f"Jaccard similarity (MinHash): {stats['jaccard']:.4f}")
+    if stats['old']:
+        percent = (stats['common'] / stats['old']) * 100
+        print(f"Common % (of old): {mark}{percent:.2f}%")
+
+def main():
+    parser = argparse.ArgumentParser(description='Diff two crawl catalogs with bounded memory.')
+    parser.add_argument('old_csv')
+    parser.add_argument('new_csv')
+    parser.add_argument('--old-articles', help='Article directory of the old crawl, for content-hash changes')
+    parser.add_argument('--new-articles', help='Article directory of the new crawl, for content-hash changes')
+    parser.add_argument('--delta-dir', help='Write added/removed/changed CSVs and recrawl_urls.txt here')
+    parser.add_argument('--approx', action='store_true', help='Sketch-based estimate (HyperLogLog/MinHash)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Rows per in-memory sort run')
+    parser.add_argument('--tmpdir', help='Where to put sort runs (defaults to the system temp dir)')
+    parser.add_argument('--json', action='store_true', help='Print the counts as JSON')
+    args = parser.parse_args()
+
+    if args.approx:
+        if args.delta_dir:
+            parser.error('--delta-dir needs exact mode')
+        stats = approx_diff(args.old_csv, args.new_csv)
+    else:
+        stats = diff_catalogs(args.old_csv, args.new_csv, args.old_articles, args.new_articles,
+                              args.delta_dir, args.chunk_size, args.tmpdir)
+    if args.json:
+        print(json.dumps(stats, indent=2))
+    else:
+        print_report(args.old_csv, args.new_csv, stats, approx=args.approx)
+
+if __name__ == "__main__":
+    main()
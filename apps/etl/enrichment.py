@@ -1,13 +1,20 @@
+import argparse
 import csv
+import hashlib
 import os
 import time
 
 import json
-from openai import ask_model
+from openai import DEFAULT_MODEL, USE_MODEL, ask_model
 
 LINKS_CSV = 'all_links.csv'
 ARTICLES_DIR = 'all_articles'
 OUTPUT_CSV = 'enriched.csv'
+# LLM results keyed by a hash of model, parser version, prompt and article text,
+# so re-runs only call the model for new or changed articles
+ENRICHMENT_CACHE = 'enrichment_cache.jsonl'
+CALL_LLM_PARSE_VERSION = 1  # Bump when call_llm changes how responses are parsed
+ENRICHMENT_FIELDS = ['entities', 'topic', 'summary', 'sources', 'aliases', 'tags', 'relationships', 'type', 'media']
 
 # Comprehensive system prompt for enrichment
 SYSTEM_PROMPT = '''
@@ -54,33 +61,153 @@ def call_llm(text):
         print("No response from LLM.")
         return {}
 
-def main():
-    with open(LINKS_CSV, 'r', encoding='utf-8') as infile, \
-         open(OUTPUT_CSV, 'w', newline='', encoding='utf-8') as outfile:
-        reader = csv.DictReader(infile)
-        base_fieldnames = reader.fieldnames if reader.fieldnames else []
-        enrichment_fields = ['entities', 'topic', 'summary', 'sources', 'aliases', 'tags', 'relationships', 'type', 'media']
-        fieldnames = base_fieldnames + [f for f in enrichment_fields if f not in base_fieldnames]
-        writer = csv.DictWriter(outfile, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in reader:
-            title = row['title']
-            filename = os.path.join(ARTICLES_DIR, f"{title.replace('/', '_')}_clean.txt")
-            if not os.path.exists(filename):
-                print(f"Warning: Article file not found for {title}")
-                continue
-            with open(filename, 'r', encoding='utf-8') as f:
-                text = f.read()
+def cache_key(text):
+    h = hashlib.sha1()
+    for part in [USE_MODEL, DEFAULT_MODEL, str(CALL_LLM_PARSE_VERSION), SYSTEM_PROMPT, text]:
+        h.update(part.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+def load_cache():
+    cache = {}
+    if os.path.exists(ENRICHMENT_CACHE):
+        with open(ENRICHMENT_CACHE, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Partial line from an interrupted run
+                cache[entry['key']] = entry['enrichment']
+    return cache
+
+def clean_filename(title):
+    return "".join(c if c.isalnum() or c in (' ', '_') else '_' for c in title).rstrip()
+
+def article_file(articles_dir, title):
+    """Path of a title's article, named as combine_and_dedup.py or as the scrapers write it, or None."""
+    for name in [title.replace('/', '_'), clean_filename(title)]:
+        filename = os.path.join(articles_dir, f"{name}_clean.txt")
+        if os.path.exists(filename):
+            return filename
+    return None
+
+def enrich_rows(rows, cache, cache_file, stats, articles_dir=ARTICLES_DIR, skip_failed=False):
+    """
+    Yield each catalog row merged with its enrichment, skipping rows without an
+    article file and, with skip_failed, rows the LLM returned nothing for.
+    """
+    for row in rows:
+        title = row['title']
+        filename = article_file(articles_dir, title)
+        if not filename:
+            print(f"Warning: Article file not found for {title}")
+            stats['missing'] += 1
+            continue
+        with open(filename, 'r', encoding='utf-8') as f:
+            text = f.read()
+        key = cache_key(text)
+        if key in cache:
+            enrichment = cache[key]
+            stats['cached'] += 1
+        else:
             # Call LLM to enrich
             enrichment = call_llm(text)
-            out_row = row.copy()
-            out_row.update(enrichment)
-            # Convert any list/dict fields to string for CSV compatibility
-            for k, v in out_row.items():
-                if isinstance(v, (list, dict)):
-                    out_row[k] = str(v)
-            writer.writerow(out_row)
+            if enrichment:
+                cache[key] = enrichment
+                cache_file.write(json.dumps({'key': key, 'enrichment': enrichment}, ensure_ascii=False) + '\n')
+                cache_file.flush()
             time.sleep(1)  # Polite delay for API rate limits
+            if not enrichment and skip_failed:
+                stats['failed'] += 1
+                continue
+        out_row = row.copy()
+        out_row.update(enrichment)
+        # Convert any list/dict fields to string for CSV compatibility
+        for k, v in out_row.items():
+            if isinstance(v, (list, dict)):
+                out_row[k] = str(v)
+        yield out_row
+
+def csv_fieldnames(paths):
+    """The combined header of several CSVs."""
+    fieldnames = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            fieldnames += [name for name in csv.DictReader(f).fieldnames or [] if name not in fieldnames]
+    return fieldnames
+
+def iter_csv_rows(paths):
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            yield from csv.DictReader(f)
+
+def upsert(links_csvs, remove_csvs, articles_dir, cache, cache_file, stats):
+    """
+    Update OUTPUT_CSV in place: enrich the rows of links_csvs, replace the rows
+    with the same url, append the others and drop the urls listed in remove_csvs.
+    Rows that could not be enriched (no article, LLM failure) leave the
+    existing row as it is.
+    """
+    updates = {}
+    rows = iter_csv_rows(links_csvs)
+    for out_row in enrich_rows(rows, cache, cache_file, stats, articles_dir, skip_failed=True):
+        updates[out_row['url']] = out_row
+    removed = {row['url'] for row in iter_csv_rows(remove_csvs)}
+    existing = [OUTPUT_CSV] if os.path.exists(OUTPUT_CSV) else []
+    fieldnames = csv_fieldnames(existing)
+    if not fieldnames:
+        delta_fields = csv_fieldnames(links_csvs)
+        fieldnames = delta_fields + [f for f in ENRICHMENT_FIELDS if f not in delta_fields]
+    tmp = OUTPUT_CSV + '.tmp'
+    with open(tmp, 'w', newline='', encoding='utf-8') as outfile:
+        # Delta-only columns such as crawl_diff's 'change' are not carried over
+        writer = csv.DictWriter(outfile, fieldnames=fieldnames, extrasaction='ignore')
+        writer.writeheader()
+        for row in iter_csv_rows(existing):
+            url = row.get('url')
+            if url in removed:
+                stats['removed'] += 1
+                continue
+            if url in updates:
+                row = updates.pop(url)
+                stats['updated'] += 1
+            writer.writerow(row)
+        for row in updates.values():
+            if row['url'] not in removed:
+                writer.writerow(row)
+                stats['added'] += 1
+    os.replace(tmp, OUTPUT_CSV)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Enrich catalog rows with LLM-extracted fields.')
+    parser.add_argument('--links', nargs='+', default=[LINKS_CSV], help='Catalog CSVs to enrich')
+    parser.add_argument('--articles', default=ARTICLES_DIR,
+                        help='Article directory, e.g. the articles/ a re-crawl just refreshed')
+    parser.add_argument('--upsert', action='store_true',
+                        help=f"Update {OUTPUT_CSV} in place by url instead of rewriting it, "
+                             "e.g. with crawl_diff.py's added.csv and changed.csv as --links")
+    parser.add_argument('--remove', nargs='+', default=[],
+                        help=f"With --upsert, catalog CSVs of urls to drop from {OUTPUT_CSV} (crawl_diff.py removed.csv)")
+    args = parser.parse_args(argv)
+    if args.remove and not args.upsert:
+        parser.error('--remove needs --upsert')
+
+    cache = load_cache()
+    stats = {'cached': 0, 'added': 0, 'updated': 0, 'removed': 0, 'failed': 0, 'missing': 0}
+    with open(ENRICHMENT_CACHE, 'a', encoding='utf-8') as cache_file:
+        if args.upsert:
+            upsert(args.links, args.remove, args.articles, cache, cache_file, stats)
+            print(f"Updated {OUTPUT_CSV}: {stats['added']} added, {stats['updated']} updated, "
+                  f"{stats['removed']} removed, {stats['failed']} kept after LLM failures, "
+                  f"{stats['missing']} without an article ({stats['cached']} reused from {ENRICHMENT_CACHE})")
+            return
+        base_fieldnames = csv_fieldnames(args.links)
+        fieldnames = base_fieldnames + [f for f in ENRICHMENT_FIELDS if f not in base_fieldnames]
+        with open(OUTPUT_CSV, 'w', newline='', encoding='utf-8') as outfile:
+            writer = csv.DictWriter(outfile, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(enrich_rows(iter_csv_rows(args.links), cache, cache_file, stats, args.articles))
+    print(f"Enriched rows written to {OUTPUT_CSV} ({stats['cached']} reused from {ENRICHMENT_CACHE})")
 
 if __name__ == "__main__":
     main()
@@ -1,4 +1,5 @@
 import csv
+import json
 import time
 from openai import ask_model
 
@@ -32,8 +33,7 @@ def batch_filter_llm(rows):
         print("No response from LLM.")
         return []
 
-if __name__ == "__main__":
-    import json
+def main():
     with open(INPUT_CSV, 'r', encoding='utf-8') as infile, \
          open(OUTPUT_CSV, 'w', newline='', encoding='utf-8') as outfile:
         reader = list(csv.DictReader(infile))
@@ -48,3 +48,6 @@ if __name__ == "__main__":
                     writer.writerow({'title': item['title'], 'url': item['url']})
             time.sleep(SLEEP_TIME)
     print(f"Filtered links written to {OUTPUT_CSV}")
+
+if __name__ == "__main__":
+    main()
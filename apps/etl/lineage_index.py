@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+Precomputed lineage and path index for the web routes (/node, /lineage, /paths).
+- Reads the enriched relationships (same rows graph_ingest.py loads into Neo4j)
+- Computes ancestor/descendant closures per lineage relation type
+- Computes pairwise shortest paths between the nodes of each curated path
+- Writes compact JSON shards the site can serve statically:
+    <out>/nodes/<slug>.json   node props, direct edges, lineage closures, curated paths
+    <out>/paths/<slug>.json   waypoints plus pairwise connecting paths
+    <out>/index.json          node id -> slug, for resolving route params
+- Rebuilds incrementally: closures are only recomputed for nodes that can reach
+  a changed edge, and only shards whose content changed are rewritten
+- Slugs are kept across builds and never reused: a new node whose slug
+  collides with a current or removed node's is the one that gets a suffix
+
+Node references inside shards are compact [slug, id] pairs; closure entries
+are [slug, id, depth].
+
+Usage:
+  python lineage_index.py [--enriched enriched.csv] [--paths curated_paths.yaml] [--out lineage_index] [--full]
+"""
+
+import argparse
+import ast
+import csv
+import gzip
+import hashlib
+import json
+import os
+import re
+import time
+import unicodedata
+from collections import deque
+
+import yaml
+
+ENRICHED_CSV = 'enriched.csv'
+CURATED_PATHS = 'curated_paths.yaml'
+OUTPUT_DIR = 'lineage_index'
+STATE_FILE = 'state.json.gz'
+STATE_VERSION = 1
+
+# Edge (a)-[REL]->(b) makes b an ancestor of a for REL
+LINEAGE_RELS = [
+    'DESCENDANT_OF',
+    'CHILD_OF',
+    'AVATAR_OF',
+    'INCARNATION_OF',
+    'MANIFESTATION_OF',
+    'REINCARNATION_OF',
+    'PAST_LIFE_OF',
+]
+MAX_PATH_HOPS = 6
+
+# Helper to safely parse stringified lists/dicts written by enrichment.py
+
+def safe_parse(val):
+    try:
+        return ast.literal_eval(val)
+    except Exception:
+        return val
+
+def slugify(text):
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    return re.sub(r'[^a-z0-9]+', '-', text).strip('-') or 'node'
+
+def assign_slugs(node_ids, previous=None):
+    """
+    Unique slugs that stay put across builds.
+
+    previous holds every slug handed out so far, including those of nodes that
+    have since been removed: ids keep theirs (a removed node that comes back
+    gets its old slug), and retired slugs stay reserved so an old link never
+    resolves to a different node. A new id whose slug is taken gets a short
+    hash suffix.
+
+    Returns:
+        dict: node id -> slug for node_ids.
+    """
+    previous = previous or {}
+    slugs = {node_id: previous[node_id] for node_id in node_ids if node_id in previous}
+    taken = set(previous.values())
+    for node_id in sorted(node_ids):
+        if node_id in slugs:
+            continue
+        slug = slugify(node_id)
+        digest = hashlib.sha1(node_id.encode('utf-8')).hexdigest()
+        length = 6
+        while slug in taken:
+            slug = f"{slugify(node_id)}-{digest[:length]}"
+            length += 2
+        taken.add(slug)
+        slugs[node_id] = slug
+    return slugs
+
+def file_digest(path):
+    h = hashlib.sha1()
+    if path and os.path.exists(path):
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+    return h.hexdigest()
+
+def load_graph(enriched_csv):
+    """Return (nodes, edges): node props keyed by id and a sorted list of (from, rel, to)."""
+    nodes = {}
+    edges = set()
+    with open(enriched_csv, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            node_id = row.get('title')
+            if not node_id:
+                continue
+            aliases = safe_parse(row.get('aliases') or '[]')
+            tags = safe_parse(row.get('tags') or '[]')
+            nodes[node_id] = {
+                'type': row.get('type') or 'CONCEPT',
+                'url': row.get('url') or '',
+                'summary': row.get('summary') or '',
+                'aliases': aliases if isinstance(aliases, list) else [],
+                'tags': tags if isinstance(tags, list) else [],
+            }
+            relationships = safe_parse(row.get('relationships') or '[]')
+            if not isinstance(relationships, list):
+                continue
+            for rel in relationships:
+                if isinstance(rel, dict) and rel.get('from') and rel.get('to'):
+                    edges.add((str(rel['from']), rel.get('rel') or 'RELATED_TO', str(rel['to'])))
+    for from_id, _, to_id in edges:
+        nodes.setdefault(from_id, {'type': None})
+        nodes.setdefault(to_id, {'type': None})
+    return nodes, sorted(edges)
+
+def load_curated_paths(path):
+    if not path or not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        config = yaml.safe_load(f) or {}
+    curated = []
+    for entry in config.get('paths') or []:
+        waypoints = [str(n) for n in entry.get('nodes') or []]
+        if entry.get('slug') and waypoints:
+            curated.append({'slug': entry['slug'], 'title': entry.get('title') or entry['slug'], 'nodes': waypoints})
+    return curated
+
+# Closures
+
+def adjacency(edges, rel_type, reverse=False):
+    adj = {}
+    for from_id, rel, to_id in edges:
+        if rel != rel_type:
+            continue
+        if reverse:
+            from_id, to_id = to_id, from_id
+        adj.setdefault(from_id, []).append(to_id)
+    return adj
+
+def closure(adj, start):
+    """All nodes reachable from start with their minimum hop count (cycle safe)."""
+    depths = {start: 0}
+    queue = deque([start])
+    while queue:
+        node = queue.popleft()
+        for nxt in adj.get(node, ()):
+            if nxt not in depths:
+                depths[nxt] = depths[node] + 1
+                queue.append(nxt)
+    del depths[start]
+    return depths
+
+def compute_closures(edges, previous=None, previous_edges=None):
+    """
+    Ancestor/descendant closures per lineage relation type.
+
+    With the previous build's closures and edges, only nodes whose closure can
+    have changed are recomputed: ancestors(x) depends on x's outgoing reach, so
+    a changed edge (a, b) invalidates a and everything that reaches a; the
+    descendant side is symmetric with b.
+    """
+    closures = {}
+    for rel_type in LINEAGE_RELS:
+        up = adjacency(edges, rel_type)
+        down = adjacency(edges, rel_type, reverse=True)
+        members = set(up) | set(down)
+        old = (previous or {}).get(rel_type)
+        if old is None or previous_edges is None:
+            dirty_up = dirty_down = members
+            old = {}
+        else:
+            old_edges = {e for e in previous_edges if e[1] == rel_type}
+            new_edges = {e for e in edges if e[1] == rel_type}
+            changed = old_edges ^ new_edges
+            old_up = adjacency(old_edges, rel_type)
+            old_down = adjacency(old_edges, rel_type, reverse=True)
+            dirty_up = set()
+            dirty_down = set()
+            for from_id, _, to_id in changed:
+                for adj in (down, old_down):
+                    dirty_up.add(from_id)
+                    dirty_up.update(closure(adj, from_id))
+                for adj in (up, old_up):
+                    dirty_down.add(to_id)
+                    dirty_down.update(closure(adj, to_id))
+        rel_closures = {}
+        for node in members:
+            prev = old.get(node, {})
+            ancestors = closure(up, node) if node in dirty_up else prev.get('ancestors', {})
+            descendants = closure(down, node) if node in dirty_down else prev.get('descendants', {})
+            if ancestors or descendants:
+                rel_closures[node] = {'ancestors': ancestors, 'descendants': descendants}
+        closures[rel_type] = rel_closures
+    return closures
+
+# Curated paths
+
+def shortest_path(neighbors, source, target, max_hops=MAX_PATH_HOPS):
+    """Breadth-first shortest path over edges in either direction; returns [(from, rel, to), ...] or None."""
+    if source == target:
+        return []
+    parents = {source: None}
+    frontier = [source]
+    for _ in range(max_hops):
+        next_frontier = []
+        for node in frontier:
+            for edge, nxt in neighbors.get(node, ()):
+                if nxt in parents:
+                    continue
+                parents[nxt] = (node, edge)
+                if nxt == target:
+                    steps = []
+                    while parents[nxt] is not None:
+                        prev, step = parents[nxt]
+                        steps.append(step)
+                        nxt = prev
+                    return steps[::-1]
+                next_frontier.append(nxt)
+        frontier = next_frontier
+        if not frontier:
+            break
+    return None
+
+def compute_paths(curated, edges):
+    neighbors = {}
+    for edge in edges:
+        from_id, _, to_id = edge
+        neighbors.setdefault(from_id, []).append((edge, to_id))
+        neighbors.setdefault(to_id, []).append((edge, from_id))
+    results = []
+    for path in curated:
+        waypoints = path['nodes']
+        pairs = {}
+        for i in range(len(waypoints)):
+            for j in range(i + 1, len(waypoints)):
+                pairs[(i, j)] = shortest_path(neighbors, waypoints[i], waypoints[j])
+        results.append({'slug': path['slug'], 'title': path['title'], 'nodes': waypoints, 'pairs': pairs})
+    return results
+
+# Shards
+
+def node_ref(slugs, node_id):
+    return [slugs[node_id], node_id]
+
+def edge_ref(slugs, edge):
+    from_id, rel, to_id = edge
+    return [slugs[from_id], rel, slugs[to_id]]
+
+def build_shards(nodes, edges, closures, paths, slugs):
+    out_edges = {}
+    in_edges = {}
+    for from_id, rel, to_id in edges:
+        out_edges.setdefault(from_id, {}).setdefault(rel, []).append(node_ref(slugs, to_id))
+        in_edges.setdefault(to_id, {}).setdefault(rel, []).append(node_ref(slugs, from_id))
+
+    node_paths = {}
+    path_shards = {}
+    for path in paths:
+        members = set(path['nodes'])
+        pairs = {}
+        for (i, j), steps in path['pairs'].items():
+            pairs[f"{i}-{j}"] = [edge_ref(slugs, step) for step in steps] if steps is not None else None
+            for step in steps or []:
+                members.update((step[0], step[2]))
+        for member in members:
+            if member in slugs:
+                node_paths.setdefault(member, []).append(path['slug'])
+        path_shards[path['slug']] = {
+            'slug': path['slug'],
+            'title': path['title'],
+            'nodes': [node_ref(slugs, n) if n in slugs else [None, n] for n in path['nodes']],
+            'segments': [pairs[f"{i}-{i + 1}"] for i in range(len(path['nodes']) - 1)],
+            'pairs': pairs,
+        }
+
+    node_shards = {}
+    for node_id, props in nodes.items():
+        lineage = {}
+        for rel_type, rel_closures in closures.items():
+            entry = rel_closures.get(node_id)
+            if not entry:
+                continue
+            lineage[rel_type] = {
+                side: sorted(([slugs[n], n, d] for n, d in entry[side].items()), key=lambda r: (r[2], r[0]))
+                for side in ('ancestors', 'descendants')
+            }
+        shard = {'id': node_id, 'slug': slugs[node_id]}
+        shard.update({k: v for k, v in props.items() if v})
+        shard['out'] = out_edges.get(node_id, {})
+        shard['in'] = in_edges.get(node_id, {})
+        shard['lineage'] = lineage
+        shard['paths'] = sorted(node_paths.get(node_id, []))
+        node_shards[slugs[node_id]] = shard
+    return node_shards, path_shards
+
+def shard_bytes(shard):
+    return json.dumps(shard, ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+def write_shards(out_dir, subdir, shards, previous_hashes):
+    """Write shards whose content changed and delete stale ones; returns (hashes, written, removed)."""
+    target = os.path.join(out_dir, subdir)
+    os.makedirs(target, exist_ok=True)
+    hashes = {}
+    written = 0
+    for slug, shard in shards.items():
+        data = shard_bytes(shard)
+        digest = hashlib.sha1(data).hexdigest()
+        hashes[slug] = digest
+        path = os.path.join(target, f"{slug}.json")
+        if previous_hashes.get(slug) == digest and os.path.exists(path):
+            continue
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+        written += 1
+    removed = 0
+    for slug in set(previous_hashes) - set(hashes):
+        path = os.path.join(target, f"{slug}.json")
+        if os.path.exists(path):
+            os.remove(path)
+            removed += 1
+    return hashes, written, removed
+
+def load_state(out_dir):
+    path = os.path.join(out_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return None
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        state = json.load(f)
+    if state.get('version') != STATE_VERSION or state.get('lineage_rels') != LINEAGE_RELS:
+        return None
+    return state
+
+def save_state(out_dir, state):
+    path = os.path.join(out_dir, STATE_FILE)
+    with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(path + '.tmp', path)
+
+def build(enriched_csv=ENRICHED_CSV, curated_paths=CURATED_PATHS, out_dir=OUTPUT_DIR, full=False):
+    start = time.time()
+    state = None if full else load_state(out_dir)
+    input_digest = f"{file_digest(enriched_csv)}:{file_digest(curated_paths)}"
+    if state and state.get('input_digest') == input_digest:
+        print(f"Lineage index in {out_dir} is up to date.")
+        return
+    nodes, edges = load_graph(enriched_csv)
+    previous_edges = [tuple(e) for e in state['edges']] if state else None
+    closures = compute_closures(edges, state['closures'] if state else None, previous_edges)
+    paths = compute_paths(load_curated_paths(curated_paths), edges)
+    # Slugs are identities rather than cached results, so --full keeps them too
+    previous_slugs = (state or load_state(out_dir) or {}).get('slugs', {})
+    slugs = assign_slugs(nodes, previous_slugs)
+    node_shards, path_shards = build_shards(nodes, edges, closures, paths, slugs)
+
+    os.makedirs(out_dir, exist_ok=True)
+    node_hashes, nodes_written, nodes_removed = write_shards(
+        out_dir, 'nodes', node_shards, state['node_hashes'] if state else {})
+    path_hashes, paths_written, paths_removed = write_shards(
+        out_dir, 'paths', path_shards, state['path_hashes'] if state else {})
+    with open(os.path.join(out_dir, 'index.json'), 'w', encoding='utf-8') as f:
+        json.dump({'nodes': slugs, 'paths': sorted(path_shards), 'lineage_rels': LINEAGE_RELS},
+                  f, ensure_ascii=False, separators=(',', ':'))
+    save_state(out_dir, {
+        'version': STATE_VERSION,
+        'lineage_rels': LINEAGE_RELS,
+        'input_digest': input_digest,
+        'edges': edges,
+        'closures': closures,
+        'slugs': {**previous_slugs, **slugs},
+        'node_hashes': node_hashes,
+        'path_hashes': path_hashes,
+    })
+    print(f"Lineage index: {len(node_shards)} nodes ({nodes_written} written, {nodes_removed} removed), "
+          f"{len(path_shards)} paths ({paths_written} written, {paths_removed} removed) "
+          f"in {time.time() - start:.2f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description='Precompute lineage closures and curated path shards.')
+    parser.add_argument('--enriched', default=ENRICHED_CSV)
+    parser.add_argument('--paths', default=CURATED_PATHS)
+    parser.add_argument('--out', default=OUTPUT_DIR)
+    parser.add_argument('--full', action='store_true', help='Ignore the previous build state (slugs are kept)')
+    args = parser.parse_args()
+    build(args.enriched, args.paths, args.out, full=args.full)
+
+if __name__ == "__main__":
+    main()
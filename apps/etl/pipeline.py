@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+ETL pipeline orchestrator (the Python counterpart of runETL in index.ts).
+- Declares every ETL script as a stage with its inputs and outputs; the DAG is
+  derived from which stage produces which file
+- Skips a stage when the content hashes of its inputs, its code and its
+  parameters match the last successful run and its outputs still exist
+- Re-checks each stage only once its upstream stages finish, so an upstream
+  re-run that produces identical output does not cascade
+- Runs independent stages concurrently, each in its own Python process
+- --dry-run prints the plan without running anything
+
+Usage:
+  python pipeline.py [--seed URL ...] [--only STAGE ...] [--force STAGE ...] [--jobs N] [--dry-run]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+ETL_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_FILE = '.pipeline_cache.json'
+DEFAULT_JOBS = 4
+
+# inputs/outputs are paths relative to the working directory (files or directories).
+# code lists the scripts whose changes should invalidate the stage.
+STAGES = {
+    'scrape': {
+        'inputs': [],
+        'outputs': ['links.csv', 'articles'],
+        'code': ['scrapeWikipedia.py'],
+        'needs_seeds': True,
+    },
+    'scrape_mp': {
+        'inputs': [],
+        'outputs': ['new_links_1.csv', 'new_articles_1'],
+        'code': ['Wikipediascrapper.py'],
+        'needs_seeds': True,
+    },
+    'combine': {
+        'inputs': ['links.csv', 'new_links_1.csv', 'articles', 'new_articles_1'],
+        'outputs': ['all_links.csv', 'all_articles'],
+        'code': ['combine_and_dedup.py'],
+    },
+    'filter_llm': {
+        'inputs': ['all_links.csv'],
+        'outputs': ['filtered_links.csv'],
+        'code': ['filter_links_llm.py', 'openai.py', 'config.yaml'],
+    },
+    'enrich': {
+        'inputs': ['all_links.csv', 'all_articles'],
+        'outputs': ['enriched.csv'],
+        'code': ['enrichment.py', 'openai.py', 'config.yaml'],
+    },
+    'graph_ingest': {
+        'inputs': ['enriched.csv'],
+        'outputs': [],
+        'code': ['graph_ingest.py'],
+    },
+    'search_index': {
+        'inputs': ['enriched.csv', 'all_articles'],
+        'outputs': ['search_index'],
+        'code': ['search_index.py'],
+    },
+    'lineage_index': {
+        'inputs': ['enriched.csv', 'curated_paths.yaml'],
+        'outputs': ['lineage_index'],
+        'code': ['lineage_index.py'],
+    },
+}
+
+# Stage bodies. Each runs inside its own worker process (see run_worker), so the
+# scripts' module-level state and multiprocessing pools stay isolated.
+
+def run_scrape(seeds):
+    import scrapeWikipedia
+    sys.argv = ['scrapeWikipedia.py'] + seeds
+    scrapeWikipedia.main()
+
+def run_scrape_mp(seeds):
+    import Wikipediascrapper
+    for seed in seeds:
+        sys.argv = ['Wikipediascrapper.py', seed]
+        Wikipediascrapper.main()
+
+def run_combine(seeds):
+    from combine_and_dedup import combine_and_dedup_articles, combine_and_dedup_csvs
+    inputs = STAGES['combine']['inputs']
+    combine_and_dedup_articles([p for p in inputs[2:] if os.path.isdir(p)], 'all_articles')
+    combine_and_dedup_csvs([p for p in inputs[:2] if os.path.exists(p)], 'all_links.csv')
+
+def run_filter_llm(seeds):
+    import filter_links_llm
+    filter_links_llm.main()
+
+def run_enrich(seeds):
+    import enrichment
+    enrichment.main([])
+
+def run_graph_ingest(seeds):
+    import graph_ingest
+    graph_ingest.ingest()
+
+def run_search_index(seeds):
+    import search_index
+    # Compact before returning so the stage's outputs are final once it is cached
+    search_index.build_index(compact_mode='inline')
+
+def run_lineage_index(seeds):
+    import lineage_index
+    lineage_index.build()
+
+# Hashing
+
+class Hasher:
+    """Content hashes for files and directories, memoised by (size, mtime) across runs."""
+
+    def __init__(self, memo):
+        self.memo = memo
+
+    def file(self, path):
+        st = os.stat(path)
+        entry = self.memo.get(path)
+        if entry and entry[0] == st.st_size and entry[1] == st.st_mtime_ns:
+            return entry[2]
+        h = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        digest = h.hexdigest()
+        self.memo[path] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+    def path(self, path):
+        if os.path.isdir(path):
+            h = hashlib.sha1()
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    full = os.path.join(root, name)
+                    h.update(os.path.relpath(full, path).encode('utf-8'))
+                    h.update(self.file(full).encode('ascii'))
+            return 'dir:' + h.hexdigest()
+        if os.path.exists(path):
+            return self.file(path)
+        return 'missing'
+
+def stage_key(name, hasher, seeds):
+    stage = STAGES[name]
+    h = hashlib.sha1(name.encode('utf-8'))
+    if stage.get('needs_seeds'):
+        h.update(json.dumps(sorted(seeds)).encode('utf-8'))
+    for path in stage['inputs']:
+        h.update(f"{path}={hasher.path(path)}".encode('utf-8'))
+    for script in stage['code']:
+        h.update(f"{script}={hasher.path(os.path.join(ETL_DIR, script))}".encode('utf-8'))
+    return h.hexdigest()
+
+def load_cache(path):
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    return {'stages': {}, 'files': {}}
+
+def save_cache(path, cache):
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=1, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+# DAG
+
+def dependencies():
+    producers = {}
+    for name, stage in STAGES.items():
+        for out in stage['outputs']:
+            producers[out] = name
+    return {
+        name: sorted({producers[p] for p in stage['inputs'] if p in producers})
+        for name, stage in STAGES.items()
+    }
+
+def topological_levels(deps, selected):
+    levels = []
+    done = set()
+    remaining = set(selected)
+    while remaining:
+        level = sorted(n for n in remaining if all(d in done or d not in selected for d in deps[n]))
+        if not level:
+            raise ValueError(f"Cycle in pipeline stages: {sorted(remaining)}")
+        levels.append(level)
+        done.update(level)
+        remaining.difference_update(level)
+    return levels
+
+def check_stage(name, hasher, cache, seeds, force):
+    """Return (key, reason) where reason is None if the cached result is still valid."""
+    stage = STAGES[name]
+    if stage.get('needs_seeds') and not seeds:
+        return None, None
+    key = stage_key(name, hasher, seeds)
+    if name in force:
+        return key, 'forced'
+    if cache['stages'].get(name) != key:
+        return key, 'inputs changed' if name in cache['stages'] else 'never run'
+    missing = [p for p in stage['outputs'] if not os.path.exists(p)]
+    if missing:
+        return key, f"missing {', '.join(missing)}"
+    return key, None
+
+def print_plan(levels, deps, hasher, cache, seeds, force):
+    print("Pipeline plan:")
+    rerun = set()
+    for i, level in enumerate(levels):
+        print(f"  level {i}:")
+        for name in level:
+            stage = STAGES[name]
+            key, reason = check_stage(name, hasher, cache, seeds, force)
+            upstream = [d for d in deps[name] if d in rerun]
+            if stage.get('needs_seeds') and not seeds:
+                status = 'skip (no --seed given)'
+            elif reason:
+                status = f"run ({reason})"
+                rerun.add(name)
+            elif upstream:
+                status = f"check after {', '.join(upstream)}"
+                rerun.add(name)
+            else:
+                status = 'cached'
+            print(f"    {name:<14} {status}")
+            print(f"      in:  {', '.join(stage['inputs']) or '-'}")
+            print(f"      out: {', '.join(stage['outputs']) or '-'}")
+
+def run_stage_process(name, seeds, workdir):
+    cmd = [sys.executable, os.path.abspath(__file__), '--worker', name]
+    for seed in seeds:
+        cmd += ['--seed', seed]
+    env = dict(os.environ)
+    env['PYTHONPATH'] = ETL_DIR + os.pathsep + env.get('PYTHONPATH', '')
+    start = time.time()
+    result = subprocess.run(cmd, cwd=workdir, env=env)
+    return result.returncode, time.time() - start
+
+def run_pipeline(selected, seeds, force, jobs, workdir):
+    deps = dependencies()
+    cache_path = os.path.join(workdir, CACHE_FILE)
+    cache = load_cache(cache_path)
+    hasher = Hasher(cache['files'])
+    pending = set(selected)
+    finished = set()
+    failed = set()
+    running = {}
+    prev_cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            while pending or running:
+                running_names = {name for name, _ in running.values()}
+                for name in sorted(pending):
+                    if any(d in pending or d in running_names for d in deps[name] if d in selected):
+                        continue
+                    pending.discard(name)
+                    if any(d in failed for d in deps[name]):
+                        print(f"[pipeline] {name}: not run (upstream failed)")
+                        failed.add(name)
+                        continue
+                    key, reason = check_stage(name, hasher, cache, seeds, force)
+                    if key is None:
+                        print(f"[pipeline] {name}: skipped (no --seed given)")
+                        finished.add(name)
+                    elif reason is None:
+                        print(f"[pipeline] {name}: cached")
+                        finished.add(name)
+                    else:
+                        print(f"[pipeline] {name}: running ({reason})")
+                        running[pool.submit(run_stage_process, name, seeds, workdir)] = (name, key)
+                        running_names.add(name)
+                if not running:
+                    continue
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, key = running.pop(future)
+                    code, elapsed = future.result()
+                    if code != 0:
+                        print(f"[pipeline] {name}: failed with exit code {code} after {elapsed:.1f}s")
+                        failed.add(name)
+                        continue
+                    print(f"[pipeline] {name}: done in {elapsed:.1f}s")
+                    # Key the cache on the inputs the stage was started with, so an input
+                    # edited while it ran is picked up next time
+                    cache['stages'][name] = key
+                    save_cache(cache_path, cache)
+                    finished.add(name)
+    finally:
+        save_cache(cache_path, cache)
+        os.chdir(prev_cwd)
+    return not failed
+
+def run_worker(name, seeds):
+    globals()[f"run_{name}"](seeds)
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the ETL stages as a cached, parallel DAG.')
+    parser.add_argument('--seed', action='append', default=[], help='Seed Wikipedia URL for the scrape stages')
+    parser.add_argument('--only', nargs='+', choices=sorted(STAGES), help='Run only these stages')
+    parser.add_argument('--force', nargs='+', default=[], choices=sorted(STAGES), help='Re-run these stages')
+    parser.add_argument('--jobs', type=int, default=DEFAULT_JOBS, help='Max stages running at once')
+    parser.add_argument('--workdir', default='.', help='Directory the stage files live in')
+    parser.add_argument('--dry-run', action='store_true', help='Print the plan and exit')
+    parser.add_argument('--worker', choices=sorted(STAGES), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker, args.seed)
+        return
+    selected = args.only or list(STAGES)
+    if args.dry_run:
+        prev_cwd = os.getcwd()
+        os.chdir(args.workdir)
+        try:
+            cache = load_cache(CACHE_FILE)
+            print_plan(topological_levels(dependencies(), selected), dependencies(),
+                       Hasher(cache['files']), cache, args.seed, set(args.force))
+        finally:
+            os.chdir(prev_cwd)
+        return
+    start = time.time()
+    ok = run_pipeline(selected, args.seed, set(args.force), args.jobs, os.path.abspath(args.workdir))
+    print(f"Pipeline {'finished' if ok else 'FAILED'} in {time.time() - start:.1f}s")
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
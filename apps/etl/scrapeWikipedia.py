@@ -7,6 +7,9 @@ Scrape (cleanly) the main body of https://en.wikipedia.org/wiki/Hinduism
 - Drops "References", "Notes", "External links", etc.
 - Writes clean UTF-8 text to ./Hinduism_clean.txt
 - Optionally writes internal links (anchor -> URL) to ./Hinduism_links.csv
+- --recrawl / --recrawl-file fetch cataloged URLs again (e.g. the
+  recrawl_urls.txt written by crawl_diff.py) instead of skipping them, without
+  following their links unless --max-depth is given
 
 Requirements:
   pip install requests beautifulsoup4 lxml
@@ -17,6 +20,7 @@ Licensing/Attribution:
 """
 
 
+import argparse
 import requests
 from bs4 import BeautifulSoup
 import os
@@ -27,6 +31,7 @@ import time
 ARTICLES_DIR = 'articles'
 LINKS_CSV = 'links.csv'
 WIKIPEDIA_BASE = 'https://en.wikipedia.org'
+MAX_DEPTH = 3  # Link hops followed from the seeds of a normal crawl
 
 def clean_filename(title):
     return "".join(c if c.isalnum() or c in (' ', '_') else '_' for c in title).rstrip()
@@ -100,25 +105,43 @@ def scrape_article(url, catalog):
         f.write('\n\n--- Hyperlinks ---\n')
         for link in sorted(links):
             f.write(link + '\n')
-    save_to_catalog(title, url)
+    # Re-crawled URLs keep their catalog row
+    if not already_scraped(url, catalog):
+        save_to_catalog(title, url)
     return links
 
 
 def main():
-    import sys
-    if len(sys.argv) < 2:
-        print("Usage: python scrapeWikipedia.py <Wikipedia Article URL> [<Another URL> ...]")
-        sys.exit(1)
-    seed_urls = sys.argv[1:]
+    parser = argparse.ArgumentParser(description='Crawl Wikipedia articles from seed URLs.')
+    parser.add_argument('urls', nargs='*', help='Wikipedia article URLs to start from')
+    parser.add_argument('--recrawl', action='store_true',
+                        help='Fetch the given URLs again even if they are already in the catalog')
+    parser.add_argument('--recrawl-file',
+                        help='File with one URL per line to fetch again, e.g. crawl_diff.py recrawl_urls.txt')
+    parser.add_argument('--max-depth', type=int,
+                        help=f"Link hops to follow from the seeds (default {MAX_DEPTH}, or 0 when re-crawling)")
+    args = parser.parse_args()
+    seed_urls = list(args.urls)
+    if args.recrawl_file:
+        with open(args.recrawl_file, 'r', encoding='utf-8') as f:
+            seed_urls += [line.strip() for line in f if line.strip()]
+    if not seed_urls:
+        parser.error("give at least one Wikipedia article URL")
     catalog = load_catalog()
     # Each item in to_scrape is a tuple: (url, depth)
     to_scrape = [(url, 0) for url in seed_urls]
     scraped = set(catalog)
-    max_depth = 3
+    # Seeds to fetch once more even though they are cataloged
+    recrawl = set(seed_urls) if args.recrawl or args.recrawl_file else set()
+    if args.max_depth is not None:
+        max_depth = args.max_depth
+    else:
+        max_depth = 0 if recrawl else MAX_DEPTH
     while to_scrape:
         current_url, depth = to_scrape.pop(0)
-        if current_url in scraped:
+        if current_url in scraped and current_url not in recrawl:
             continue
+        recrawl.discard(current_url)
         try:
             new_links = scrape_article(current_url, scraped)
         except Exception as e:
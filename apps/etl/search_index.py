@@ -0,0 +1,1676 @@
+#!/usr/bin/env python3
+"""
+Local inverted-index search over the article corpus and enrichment output.
+- Streams enriched.csv and the matching article text from all_articles/
+- Stores postings in fixed-size column-wise blocks (delta-coded doc ids,
+  per-field term frequencies) with a skip table and per-block score bounds
+- Scores with BM25F so title/aliases/tags boosts can be tuned at query time
+- Exact top-k of queries made of frequent terms starts from their
+  impact-ordered champion lists and stops as soon as their bounds prove the
+  top k; otherwise block-max MaxScore answers the query, per-term and
+  per-block score bounds letting it skip postings that cannot reach the top k
+- Opt-in approximate mode reads only the champion lists of frequent terms
+- Prefix search on the lexicon and on titles/aliases for autocomplete, with the
+  expansion capped by the postings it reads and precomputed tables for prefixes
+  with many matches
+- Updates incrementally: rows whose fields and article size/mtime are unchanged
+  are skipped unread, new and changed documents go to a small delta segment with
+  tombstones for the base documents they replace, and the delta is merged into
+  the base in the background once it grows
+- Optionally exports a Meilisearch-compatible documents file
+
+Usage:
+  python search_index.py build [--enriched enriched.csv] [--articles all_articles] [--out search_index]
+                                [--full] [--compact background|inline|never]
+  python search_index.py compact [--index search_index]
+  python search_index.py query "vishnu avatar" [--prefix] [--approximate] [--limit 10]
+  python search_index.py suggest "bhaga"
+  python search_index.py export-meili meili_documents.json
+"""
+
+import argparse
+import ast
+import bisect
+import csv
+import fcntl
+import gzip
+import hashlib
+import heapq
+import itertools
+import json
+import math
+import mmap
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+import unicodedata
+import zlib
+from array import array
+from contextlib import contextmanager
+from datetime import datetime
+
+ENRICHED_CSV = 'enriched.csv'
+ARTICLES_DIR = 'all_articles'
+INDEX_DIR = 'search_index'
+INDEX_VERSION = 4
+# Files of the single-directory layout written by index version 2
+V2_FILES = ['postings.bin', 'skip_docs.bin', 'skip_ends.bin', 'block_max.bin', 'lexicon.json', 'docs.json',
+            'names.json', 'prefixes.json', 'forward.jsonl.gz']
+
+# Field order matters: it defines the bit positions in each posting's field mask.
+FIELDS = ['title', 'aliases', 'tags', 'topic', 'entities', 'summary', 'body']
+FIELD_BOOSTS = {
+    'title': 4.0,
+    'aliases': 3.0,
+    'tags': 2.0,
+    'topic': 1.5,
+    'entities': 1.2,
+    'summary': 1.0,
+    'body': 0.5,
+}
+K1 = 1.2
+B = 0.75
+BLOCK_SIZE = 64  # Postings per block; the unit of skipping and of decoding
+PREFIX_EXPANSIONS = 10  # Max lexicon terms a trailing prefix expands to
+PREFIX_POSTINGS_BUDGET = 20000  # Max postings (summed df) a prefix expansion may add
+# Prefixes matching more names/terms than this are answered from precomputed
+# tables; smaller ranges are scanned at query time.
+PREFIX_SCAN_LIMIT = 256
+SUGGEST_TABLE_SIZE = 20  # Shortest names kept per prefix in the suggest table
+PREFIX_TABLE_SIZE = 32  # Most frequent terms kept per prefix in the lexicon table
+# Terms in more than CHAMPION_MIN_DF documents of a segment also get a champion
+# list there: their CHAMPION_LIST_SIZE highest-impact postings under the
+# build-time boosts, best first, which search() reads before the full list.
+# Rarer terms' impacts are too even for a short list to bound the rest.
+CHAMPION_LIST_SIZE = 1000
+CHAMPION_MIN_DF = 4000
+CHAMPION_PROBES = 2000  # Random accesses search() spends on champion lists before falling back to MaxScore
+END = 1 << 62  # Doc id of an exhausted cursor
+# Compact once the delta's documents plus tombstones reach this many, and this
+# share of the base segment
+COMPACT_MIN_DOCS = 1000
+COMPACT_RATIO = 0.1
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from has have he her his in is it its of on or she that the their they this
+to was were which who with
+""".split())
+
+TOKEN_RE = re.compile(r'\w+')
+GENERATION_RE = re.compile(r'(?:base|delta)-(\d+)')  # Segment directory names
+HYPERLINKS_MARKER = '\n--- Hyperlinks ---\n'
+
+# Helper to safely parse stringified lists/dicts written by enrichment.py
+
+def safe_parse(val):
+    try:
+        return ast.literal_eval(val)
+    except Exception:
+        return val
+
+def normalize(text):
+    """Lowercase and strip diacritics so 'Śruti' matches 'sruti'."""
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall(normalize(text)) if t not in STOPWORDS]
+
+def field_text(val):
+    val = safe_parse(val) if val else ''
+    if isinstance(val, (list, tuple)):
+        return ' '.join(field_text(v) if not isinstance(v, str) else v for v in val)
+    if isinstance(val, dict):
+        return ' '.join(str(v) for v in val.values() if v)
+    return str(val) if val else ''
+
+def article_path(articles_dir, title):
+    return os.path.join(articles_dir, f"{title.replace('/', '_')}_clean.txt")
+
+def read_article(articles_dir, title):
+    if not articles_dir:
+        return ''
+    path = article_path(articles_dir, title)
+    if not os.path.exists(path):
+        return ''
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    return text.split(HYPERLINKS_MARKER, 1)[0]
+
+def doc_key(row):
+    return row.get('url') or row.get('title')
+
+def iter_rows(enriched_csv):
+    """Yield (key, row) for each enriched row."""
+    with open(enriched_csv, 'r', encoding='utf-8') as f:
+        reader = csv.DictReader(f)
+        for row in reader:
+            key = doc_key(row)
+            if key:
+                yield key, row
+
+def document(row, articles_dir):
+    """Stored fields and raw field texts of an enriched row, reading its article."""
+    texts = {
+        'title': row.get('title') or '',
+        'aliases': field_text(row.get('aliases')),
+        'tags': field_text(row.get('tags')),
+        'topic': field_text(row.get('topic')),
+        'entities': field_text(row.get('entities')),
+        'summary': row.get('summary') or '',
+        'body': read_article(articles_dir, row.get('title') or ''),
+    }
+    aliases = safe_parse(row.get('aliases') or '[]')
+    stored = {
+        'title': row.get('title') or '',
+        'url': row.get('url') or '',
+        'type': row.get('type') or '',
+        'aliases': [a for a in aliases if isinstance(a, str)] if isinstance(aliases, list) else [],
+    }
+    return stored, texts
+
+def content_hash(stored, texts):
+    h = hashlib.sha1()
+    h.update(json.dumps(stored, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+    for field in FIELDS:
+        h.update(b'\0')
+        h.update(texts[field].encode('utf-8'))
+    return h.hexdigest()
+
+def analyze(texts):
+    """Per-field term frequencies and lengths for one document."""
+    tfs = []
+    lengths = []
+    for field in FIELDS:
+        tokens = tokenize(texts[field])
+        counts = {}
+        for t in tokens:
+            counts[t] = counts.get(t, 0) + 1
+        tfs.append(counts)
+        lengths.append(len(tokens))
+    return tfs, lengths
+
+# Postings encoding while building: for each document, varint(doc id gap), one
+# byte field mask, then varint(tf) for each field whose bit is set.
+#
+# On disk a term's postings are cut into BLOCK_SIZE blocks stored column-wise so
+# a block decodes with array casts instead of a Python loop: a header with the
+# byte width of the doc id gaps, the mask of fields present and each field's tf
+# width, then the gaps and one tf column per present field (0 where a document
+# lacks the field). Gaps run on across blocks, so a block decodes on its own from
+# the last doc id of the block before it. Per block the skip files hold that last
+# doc id, the block's end offset and, per field, its max length-normalised tf
+# (tf / norm, the quantity BM25F sums), followed by its max document impact
+# (the boosted sum) under the build-time boosts. Both bound the block's scores.
+
+WIDTH_TYPECODES = {1: 'B', 2: 'H', 4: 'I'}
+
+def encode_varint(n, out):
+    while n >= 0x80:
+        out.append((n & 0x7f) | 0x80)
+        n >>= 7
+    out.append(n)
+
+def encode_posting(doc_gap, fields, out):
+    encode_varint(doc_gap, out)
+    mask = 0
+    for field_idx, _ in fields:
+        mask |= 1 << field_idx
+    out.append(mask)
+    for _, tf in fields:
+        encode_varint(tf, out)
+
+def decode_postings(buf):
+    """Decode postings into parallel lists of doc ids and [(field_idx, tf), ...]."""
+    docs = []
+    postings = []
+    pos = 0
+    end = len(buf)
+    doc_id = 0
+    while pos < end:
+        gap = 0
+        shift = 0
+        while True:
+            byte = buf[pos]
+            pos += 1
+            gap |= (byte & 0x7f) << shift
+            if byte < 0x80:
+                break
+            shift += 7
+        doc_id += gap
+        mask = buf[pos]
+        pos += 1
+        fields = []
+        field_idx = 0
+        while mask:
+            if mask & 1:
+                tf = 0
+                shift = 0
+                while True:
+                    byte = buf[pos]
+                    pos += 1
+                    tf |= (byte & 0x7f) << shift
+                    if byte < 0x80:
+                        break
+                    shift += 7
+                fields.append((field_idx, tf))
+            mask >>= 1
+            field_idx += 1
+        docs.append(doc_id)
+        postings.append(fields)
+    return docs, postings
+
+def field_norm(length, avg):
+    return (1 - B + B * length / avg) if avg else 1.0
+
+def int_width(n):
+    return 1 if n < 0x100 else 2 if n < 0x10000 else 4
+
+def encode_block(gaps, columns, out):
+    """Append one block given its doc id gaps and {field_idx: tf column}."""
+    width = int_width(max(gaps))
+    present = sorted(columns)
+    mask = 0
+    for field_idx in present:
+        mask |= 1 << field_idx
+    widths = [int_width(max(columns[f])) for f in present]
+    out.append(width)
+    out.append(mask)
+    out.extend(widths)
+    out.extend(array(WIDTH_TYPECODES[width], gaps).tobytes())
+    for field_idx, w in zip(present, widths):
+        out.extend(array(WIDTH_TYPECODES[w], columns[field_idx]).tobytes())
+
+def decode_block(buf, base):
+    """Decode one block into its doc ids and [(field_idx, tf column), ...]."""
+    width = buf[0]
+    mask = buf[1]
+    present = [f for f in range(len(FIELDS)) if mask >> f & 1]
+    widths = buf[2:2 + len(present)]
+    pos = 2 + len(present)
+    n = (len(buf) - pos) // (width + sum(widths))
+    view = memoryview(buf)
+    end = pos + n * width
+    gaps = view[pos:end].cast(WIDTH_TYPECODES[width]).tolist()
+    gaps[0] += base
+    columns = []
+    for field_idx, w in zip(present, widths):
+        columns.append((field_idx, view[end:end + n * w].cast(WIDTH_TYPECODES[w]).tolist()))
+        end += n * w
+    return list(itertools.accumulate(gaps)), columns
+
+def find_posting(buf, base, doc):
+    """[(field_idx, tf), ...] of doc in one block without decoding the whole block, or None if it lacks doc."""
+    width = buf[0]
+    mask = buf[1]
+    present = [f for f in range(len(FIELDS)) if mask >> f & 1]
+    widths = buf[2:2 + len(present)]
+    pos = 2 + len(present)
+    n = (len(buf) - pos) // (width + sum(widths))
+    view = memoryview(buf)
+    end = pos + n * width
+    docs = list(itertools.accumulate(view[pos:end].cast(WIDTH_TYPECODES[width]), initial=base))
+    i = bisect.bisect_left(docs, doc, 1) - 1
+    if i == n or docs[i + 1] != doc:
+        return None
+    fields = []
+    for field_idx, w in zip(present, widths):
+        tf = view[end + i * w:end + (i + 1) * w].cast(WIDTH_TYPECODES[w])[0]
+        if tf:
+            fields.append((field_idx, tf))
+        end += n * w
+    return fields
+
+def encode_blocked(docs, postings, out, lengths, avg_lengths, boosts):
+    """
+    Append one term's postings to out in BLOCK_SIZE blocks.
+
+    Returns:
+        tuple: (last doc id per block, block end offsets relative to the term's
+        start, per-block maxima (normalised tf per field, then impact), the
+        same over all blocks).
+    """
+    start = len(out)
+    last_docs = []
+    ends = []
+    block_max = []
+    term_max = [0.0] * (len(FIELDS) + 1)
+    prev = 0
+    for b in range(0, len(docs), BLOCK_SIZE):
+        maxima = [0.0] * (len(FIELDS) + 1)
+        block_docs = docs[b:b + BLOCK_SIZE]
+        gaps = []
+        columns = {}
+        for i, (doc_id, fields) in enumerate(zip(block_docs, postings[b:b + BLOCK_SIZE])):
+            gaps.append(doc_id - prev)
+            prev = doc_id
+            doc_lengths = lengths[doc_id]
+            impact = 0.0
+            for field_idx, tf in fields:
+                column = columns.get(field_idx)
+                if column is None:
+                    column = columns[field_idx] = [0] * len(block_docs)
+                column[i] = tf
+                norm = field_norm(doc_lengths[field_idx], avg_lengths[field_idx])
+                value = tf / norm
+                impact += boosts[field_idx] * tf / norm
+                if value > maxima[field_idx]:
+                    maxima[field_idx] = value
+            if impact > maxima[-1]:
+                maxima[-1] = impact
+        encode_block(gaps, columns, out)
+        last_docs.append(prev)
+        ends.append(len(out) - start)
+        block_max.extend(maxima)
+        term_max = [max(a, m) for a, m in zip(term_max, maxima)]
+    return last_docs, ends, block_max, term_max
+
+def average_lengths(docs):
+    totals = [0] * len(FIELDS)
+    for doc in docs:
+        for i, length in enumerate(doc[3]):
+            totals[i] += length
+    return [t / len(docs) if docs else 0.0 for t in totals]
+
+def prefix_range(keys, prefix, lo=0, hi=None):
+    """Index range of the sorted keys that start with prefix."""
+    if hi is None:
+        hi = len(keys)
+    lo = bisect.bisect_left(keys, prefix, lo, hi)
+    return lo, bisect.bisect_left(keys, prefix + '\uffff', lo, hi)
+
+def prefix_table(keys, rank, size):
+    """
+    The best `size` indices by rank for every prefix of the sorted keys that
+    matches more than PREFIX_SCAN_LIMIT of them.
+    """
+    table = {}
+    groups = [('', 0, len(keys))]
+    while groups:
+        prefix, lo, hi = groups.pop()
+        n = len(prefix) + 1
+        # Keys equal to the prefix itself sort first and have no longer prefix
+        i = lo
+        while i < hi and len(keys[i]) < n:
+            i += 1
+        while i < hi:
+            p = keys[i][:n]
+            _, j = prefix_range(keys, p, i, hi)
+            if j - i > PREFIX_SCAN_LIMIT:
+                table[p] = heapq.nsmallest(size, range(i, j), key=rank)
+                groups.append((p, i, j))
+            i = j
+    return table
+
+# Index building
+#
+# An index directory holds a base segment and at most one delta segment, each in
+# its own generation directory (base-000001/, delta-000002/, ...) named by
+# manifest.json. A build leaves the base alone: new and changed documents go to a
+# fresh delta and the base documents they replace, or that were removed, are
+# listed in the delta's tombstones.json. Queries merge both and skip tombstoned
+# documents. Once the delta grows past COMPACT_MIN_DOCS and COMPACT_RATIO of the
+# base, compact() merges the two into a new base, by default in a background
+# process. state.json.gz in the newest generation maps each document key to
+# [row hash, article size, article mtime_ns, content hash, segment, local doc id]
+# so unchanged rows are skipped without reading their article.
+
+def row_hash(row):
+    return hashlib.sha1(json.dumps(row, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+def article_stat(articles_dir, title):
+    """[size, mtime_ns] of a document's article file, or [-1, -1] if it has none."""
+    if not articles_dir:
+        return [-1, -1]
+    try:
+        st = os.stat(article_path(articles_dir, title))
+    except FileNotFoundError:
+        return [-1, -1]
+    return [st.st_size, st.st_mtime_ns]
+
+@contextmanager
+def index_lock(index_dir):
+    """Hold an exclusive lock on index_dir while a build or compaction writes to it."""
+    with open(os.path.join(index_dir, '.lock'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def read_manifest(index_dir):
+    path = os.path.join(index_dir, 'manifest.json')
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def load_manifest(index_dir):
+    """The manifest of a compatible previous build, or None."""
+    manifest = read_manifest(index_dir)
+    if manifest is None:
+        return None
+    if (manifest.get('version') != INDEX_VERSION or manifest.get('fields') != FIELDS
+            or manifest.get('boosts') != build_boosts()):
+        return None
+    return manifest
+
+def save_manifest(index_dir, manifest):
+    path = os.path.join(index_dir, 'manifest.json')
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+def build_boosts():
+    return [FIELD_BOOSTS.get(f, 1.0) for f in FIELDS]
+
+def newest_generation(index_dir, manifest):
+    return os.path.join(index_dir, manifest['delta'] or manifest['base'])
+
+def load_state(gen_dir):
+    with gzip.open(os.path.join(gen_dir, 'state.json.gz'), 'rt', encoding='utf-8') as f:
+        return json.load(f)
+
+def save_state(gen_dir, state):
+    path = os.path.join(gen_dir, 'state.json.gz')
+    with gzip.open(path + '.tmp', 'wt', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(path + '.tmp', path)
+
+def write_forward(gen_dir, entries):
+    """
+    Write the forward store (per-document analyzed fields): one zlib-compressed
+    JSON record per document and their offsets, so single documents can be read back.
+    """
+    offsets = array('Q', [0])
+    with open(os.path.join(gen_dir, 'forward.bin'), 'wb') as f:
+        for entry in entries:
+            f.write(zlib.compress(json.dumps(entry, ensure_ascii=False, separators=(',', ':')).encode('utf-8')))
+            offsets.append(f.tell())
+    with open(os.path.join(gen_dir, 'forward_offsets.bin'), 'wb') as f:
+        offsets.tofile(f)
+
+def read_forward(gen_dir, doc_ids=None):
+    """Yield forward store entries, all of them or those of the given doc ids in order."""
+    offsets = array('Q')
+    with open(os.path.join(gen_dir, 'forward_offsets.bin'), 'rb') as f:
+        offsets.frombytes(f.read())
+    with open(os.path.join(gen_dir, 'forward.bin'), 'rb') as f:
+        for doc_id in range(len(offsets) - 1) if doc_ids is None else doc_ids:
+            f.seek(offsets[doc_id])
+            yield json.loads(zlib.decompress(f.read(offsets[doc_id + 1] - offsets[doc_id])))
+
+def build_index(enriched_csv=ENRICHED_CSV, articles_dir=ARTICLES_DIR, index_dir=INDEX_DIR, full=False,
+                compact_mode='background'):
+    """
+    Build (or incrementally refresh) the on-disk index.
+
+    Rows whose CSV fields and article size/mtime match the previous build are
+    skipped without reading the article; of the rest only those whose content
+    changed are tokenized. They are written to a new delta segment and the base
+    segment is not touched.
+
+    Args:
+        full (bool): Ignore the previous build and write a new base segment.
+        compact_mode (str): When the delta has grown enough, compact in a
+            'background' process, 'inline' before returning, or 'never'.
+
+    Returns:
+        dict: counts of added, changed, unchanged and removed documents.
+    """
+    start = time.time()
+    os.makedirs(index_dir, exist_ok=True)
+    with index_lock(index_dir):
+        manifest = None if full else load_manifest(index_dir)
+        state = load_state(newest_generation(index_dir, manifest)) if manifest else {}
+        stats = {'added': 0, 'changed': 0, 'unchanged': 0, 'removed': 0}
+        entries = []
+        new_state = {}
+        touched = False
+        seen = set()
+        for key, row in iter_rows(enriched_csv):
+            if key in seen:
+                continue
+            seen.add(key)
+            row_digest = row_hash(row)
+            stat = article_stat(articles_dir, row.get('title') or '')
+            old = state.get(key)
+            if old is not None and old[0] == row_digest and old[1:3] == stat:
+                stats['unchanged'] += 1
+                continue
+            stored, texts = document(row, articles_dir)
+            digest = content_hash(stored, texts)
+            if old is not None and old[3] == digest:
+                old[:3] = [row_digest] + stat
+                touched = True
+                stats['unchanged'] += 1
+                continue
+            tfs, lengths = analyze(texts)
+            entries.append({'key': key, 'hash': digest, 'stored': stored, 'lengths': lengths, 'tf': tfs})
+            new_state[key] = [row_digest] + stat + [digest]
+            stats['changed' if old is not None else 'added'] += 1
+        removed = [key for key in state if key not in seen]
+        stats['removed'] = len(removed)
+
+        if manifest is None:
+            write_base(index_dir, entries, new_state)
+            print(f"Indexed {len(entries)} documents into {index_dir} in {time.time() - start:.2f}s")
+            return stats
+        if not entries and not removed:
+            if touched:
+                save_state(newest_generation(index_dir, manifest), state)
+            print(f"Search index in {index_dir} is up to date ({stats['unchanged']} documents).")
+            return stats
+        delta_size = write_delta(index_dir, manifest, state, entries, new_state, removed)
+        print(f"Updated {index_dir} in {time.time() - start:.2f}s (added {stats['added']}, "
+              f"changed {stats['changed']}, unchanged {stats['unchanged']}, removed {stats['removed']}; "
+              f"delta {delta_size[0]} documents, {delta_size[1]} tombstones)")
+        base_docs = manifest['base_doc_count']
+        if compact_mode == 'never' or sum(delta_size) < max(COMPACT_MIN_DOCS, COMPACT_RATIO * base_docs):
+            return stats
+        if compact_mode == 'background':
+            start_compaction(index_dir)
+            return stats
+    compact(index_dir)
+    return stats
+
+def segment_data(entries):
+    """Stored documents, sorted names and (term, doc ids, fields) postings for entries in doc id order."""
+    postings = {}
+    last_doc = {}
+    names = []
+    docs = []
+    for doc_id, entry in enumerate(entries):
+        accumulate(postings, last_doc, doc_id, entry['tf'])
+        stored = entry['stored']
+        docs.append([stored['title'], stored['url'], stored['type'], entry['lengths']])
+        names.append([normalize(stored['title']), doc_id])
+        for alias in stored.get('aliases', []):
+            names.append([normalize(alias), doc_id])
+    names.sort()
+    return docs, names, ((term, *decode_postings(postings.pop(term))) for term in sorted(postings))
+
+def accumulate(postings, last_doc, doc_id, tfs):
+    """Append one document's per-field term frequencies to in-memory postings (unblocked encoding)."""
+    per_term = {}
+    for field_idx, counts in enumerate(tfs):
+        for term, tf in counts.items():
+            per_term.setdefault(term, []).append((field_idx, tf))
+    for term, fields in per_term.items():
+        buf = postings.get(term)
+        if buf is None:
+            buf = postings[term] = bytearray()
+        encode_posting(doc_id - last_doc.get(term, 0), fields, buf)
+        last_doc[term] = doc_id
+
+def new_generation(index_dir, kind):
+    """Create the directory of the next generation; returns (number, name, path)."""
+    numbers = [int(m.group(1)) for m in map(GENERATION_RE.fullmatch, os.listdir(index_dir)) if m]
+    generation = max(numbers, default=0) + 1
+    name = f"{kind}-{generation:06d}"
+    gen_dir = os.path.join(index_dir, name)
+    os.makedirs(gen_dir)
+    return generation, name, gen_dir
+
+def publish(index_dir, generation, base, delta, doc_count, base_doc_count):
+    """
+    Swap in a new manifest, then drop generations neither it nor the previous
+    manifest names. Readers that loaded the previous manifest can still open
+    its segments.
+    """
+    previous = read_manifest(index_dir) or {}
+    save_manifest(index_dir, {
+        'version': INDEX_VERSION,
+        'fields': FIELDS,
+        'boosts': build_boosts(),
+        'block_size': BLOCK_SIZE,
+        'champion_list_size': CHAMPION_LIST_SIZE,
+        'champion_min_df': CHAMPION_MIN_DF,
+        'generation': generation,
+        'base': base,
+        'delta': delta,
+        'doc_count': doc_count,
+        'base_doc_count': base_doc_count,
+        'built_at': datetime.now().isoformat(),
+    })
+    keep = {base, delta, previous.get('base'), previous.get('delta')}
+    for name in os.listdir(index_dir):
+        if GENERATION_RE.fullmatch(name) and name not in keep:
+            shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+    for name in V2_FILES:
+        path = os.path.join(index_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+def write_base(index_dir, entries, new_state):
+    generation, name, gen_dir = new_generation(index_dir, 'base')
+    docs, names, postings = segment_data(entries)
+    write_segment(gen_dir, docs, names, postings, build_boosts())
+    write_forward(gen_dir, entries)
+    save_state(gen_dir, {entry['key']: new_state[entry['key']] + ['b', doc_id]
+                         for doc_id, entry in enumerate(entries)})
+    publish(index_dir, generation, name, None, len(docs), len(docs))
+
+def write_delta(index_dir, manifest, state, entries, new_state, removed):
+    """
+    Write a new delta segment holding the previous delta's documents that were
+    not replaced plus entries, and tombstone the base documents they replace.
+
+    Returns:
+        tuple: (documents in the delta, tombstoned base documents).
+    """
+    base_dir = os.path.join(index_dir, manifest['base'])
+    tombstones = {'docs': [], 'df': {}}
+    delta_entries = []
+    if manifest['delta']:
+        delta_dir = os.path.join(index_dir, manifest['delta'])
+        with open(os.path.join(delta_dir, 'tombstones.json'), 'r', encoding='utf-8') as f:
+            tombstones = json.load(f)
+        delta_entries = list(read_forward(delta_dir))
+    replaced = set(removed)
+    replaced.update(entry['key'] for entry in entries)
+    dead = sorted(state[key][5] for key in replaced if key in state and state[key][4] == 'b')
+    # Record how many tombstoned documents each term loses, so queries get the live df
+    dead_df = tombstones['df']
+    for entry in read_forward(base_dir, dead):
+        for term in set().union(*entry['tf']):
+            dead_df[term] = dead_df.get(term, 0) + 1
+    tombstones['docs'] = sorted(tombstones['docs'] + dead)
+    delta_entries = [entry for entry in delta_entries if entry['key'] not in replaced] + entries
+
+    generation, name, gen_dir = new_generation(index_dir, 'delta')
+    docs, names, postings = segment_data(delta_entries)
+    write_segment(gen_dir, docs, names, postings, build_boosts())
+    write_forward(gen_dir, delta_entries)
+    with open(os.path.join(gen_dir, 'tombstones.json'), 'w', encoding='utf-8') as f:
+        json.dump(tombstones, f, ensure_ascii=False, separators=(',', ':'))
+    for key in removed:
+        del state[key]
+    state.update(new_state)
+    for doc_id, entry in enumerate(delta_entries):
+        state[entry['key']][3:] = [entry['hash'], 'd', doc_id]
+    save_state(gen_dir, state)
+    publish(index_dir, generation, manifest['base'], name, len(state), manifest['base_doc_count'])
+    return len(delta_entries), len(tombstones['docs'])
+
+def start_compaction(index_dir):
+    """Run compact() in a detached process; it waits for the build to release the lock."""
+    with open(os.path.join(index_dir, 'compact.log'), 'a') as log:
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), 'compact', '--index', os.path.abspath(index_dir)],
+                         stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+    print(f"Compacting {index_dir} in the background (log in {os.path.join(index_dir, 'compact.log')})")
+
+def compact(index_dir=INDEX_DIR):
+    """
+    Merge the delta segment into a new base segment. Postings are merged block by
+    block from the two segments, dropping tombstoned documents, so nothing is
+    re-tokenized.
+
+    Returns:
+        int: documents in the new base, or None if there was no delta.
+    """
+    start = time.time()
+    with index_lock(index_dir):
+        manifest = load_manifest(index_dir)
+        if manifest is None or not manifest['delta']:
+            print(f"Search index in {index_dir} has no delta to compact.")
+            return None
+        base_dir = os.path.join(index_dir, manifest['base'])
+        delta_dir = os.path.join(index_dir, manifest['delta'])
+        with open(os.path.join(delta_dir, 'tombstones.json'), 'r', encoding='utf-8') as f:
+            dead = set(json.load(f)['docs'])
+        base = _Segment(base_dir)
+        delta = _Segment(delta_dir)
+        try:
+            # Live base documents keep their order and the delta's follow them
+            remap = []
+            live = 0
+            for doc_id in range(base.doc_count):
+                if doc_id in dead:
+                    remap.append(-1)
+                else:
+                    remap.append(live)
+                    live += 1
+            remap.extend(range(live, live + delta.doc_count))
+            docs = [base.document(doc_id) for doc_id in range(base.doc_count) if doc_id not in dead]
+            docs += [delta.document(doc_id) for doc_id in range(delta.doc_count)]
+            names = [[key, remap[doc_id]] for key, doc_id in zip(base.name_keys, base.name_docs)
+                     if remap[doc_id] >= 0]
+            names += [[key, live + doc_id] for key, doc_id in zip(delta.name_keys, delta.name_docs)]
+            names.sort()
+            generation, name, gen_dir = new_generation(index_dir, 'base')
+            write_segment(gen_dir, docs, names, merged_postings(base, delta, remap), build_boosts())
+        finally:
+            base.close()
+            delta.close()
+        write_forward(gen_dir, itertools.chain(
+            (entry for doc_id, entry in enumerate(read_forward(base_dir)) if doc_id not in dead),
+            read_forward(delta_dir)))
+        state = load_state(delta_dir)
+        for value in state.values():
+            value[4:] = ['b', remap[value[5]] if value[4] == 'b' else live + value[5]]
+        save_state(gen_dir, state)
+        publish(index_dir, generation, name, None, len(docs), len(docs))
+    print(f"Compacted {index_dir} into {len(docs)} documents in {time.time() - start:.2f}s")
+    return len(docs)
+
+def merged_postings(base, delta, remap):
+    """(term, doc ids, fields) for every term of the two segments, with doc ids remapped."""
+    offset = base.doc_count
+    for term in sorted(set(base.terms).union(delta.terms)):
+        doc_ids = []
+        fields = []
+        for seg, base_id in [(base, 0), (delta, offset)]:
+            term_id = seg.term_ids.get(term)
+            if term_id is None:
+                continue
+            for docs, columns in seg.iter_blocks(term_id):
+                for i, doc_id in enumerate(docs):
+                    doc_id = remap[doc_id + base_id]
+                    if doc_id < 0:
+                        continue
+                    doc_ids.append(doc_id)
+                    fields.append([(field_idx, column[i]) for field_idx, column in columns if column[i]])
+        if doc_ids:
+            yield term, doc_ids, fields
+
+def write_segment(seg_dir, docs, names, postings, boosts):
+    """
+    Write blocked postings with their skip files, champion lists, the lexicon,
+    stored documents and field lengths, the names index and the prefix tables
+    into seg_dir.
+
+    Args:
+        docs (list): [title, url, type, field lengths] per document.
+        postings: (term, doc ids, fields) tuples in term order.
+        boosts (list): Per-field build-time boosts, for block impacts and champion lists.
+    """
+    os.makedirs(seg_dir, exist_ok=True)
+    avg_lengths = average_lengths(docs)
+    terms = []
+    df = []
+    offsets = [0]
+    blocks = [0]
+    max_norm_tf = []
+    champion_postings_by_term = []
+    lengths = [doc[3] for doc in docs]
+    write_documents(seg_dir, docs)
+    skip_docs = array('I')
+    skip_ends = array('I')
+    block_max = array('d')
+    with open(os.path.join(seg_dir, 'postings.bin'), 'wb') as f:
+        for term, doc_ids, fields in postings:
+            buf = bytearray()
+            last_docs, ends, maxima, term_max = encode_blocked(doc_ids, fields, buf, lengths, avg_lengths,
+                                                               boosts)
+            f.write(buf)
+            if len(doc_ids) > CHAMPION_MIN_DF:
+                champion_postings_by_term.append(
+                    (len(terms), champion_postings(doc_ids, fields, lengths, avg_lengths, boosts)))
+            terms.append(term)
+            df.append(len(doc_ids))
+            offsets.append(offsets[-1] + len(buf))
+            skip_docs.extend(last_docs)
+            skip_ends.extend(ends)
+            block_max.extend(maxima)
+            blocks.append(len(skip_docs))
+            max_norm_tf.extend(term_max)
+        # Champion lists follow the full postings, with their blocks after the full lists' blocks
+        pos = offsets[-1]
+        champion_lists = {}
+        for term_id, top in champion_postings_by_term:
+            buf = bytearray()
+            last_docs, ends, maxima = encode_champions(top, buf, lengths, avg_lengths, boosts)
+            f.write(buf)
+            # The lowest impact in the list bounds the impacts of the term's other postings
+            champion_lists[term_id] = [pos, len(skip_docs), len(last_docs), top[-1][0]]
+            pos += len(buf)
+            skip_docs.extend(last_docs)
+            skip_ends.extend(ends)
+            block_max.extend(maxima)
+    with open(os.path.join(seg_dir, 'skip_docs.bin'), 'wb') as f:
+        skip_docs.tofile(f)
+    with open(os.path.join(seg_dir, 'skip_ends.bin'), 'wb') as f:
+        skip_ends.tofile(f)
+    with open(os.path.join(seg_dir, 'block_max.bin'), 'wb') as f:
+        block_max.tofile(f)
+    lexicon = {'terms': terms, 'df': df, 'offsets': offsets, 'blocks': blocks,
+               'max_norm_tf': max_norm_tf, 'champions': champion_lists, 'doc_count': len(docs),
+               'length_totals': [sum(doc[3][i] for doc in docs) for i in range(len(FIELDS))],
+               'avg_lengths': avg_lengths, 'boosts': boosts}
+    name_keys = [n[0] for n in names]
+    prefixes = {
+        'names': prefix_table(name_keys, lambda i: (len(name_keys[i]), i), SUGGEST_TABLE_SIZE),
+        'terms': prefix_table(terms, lambda i: (-df[i], i), PREFIX_TABLE_SIZE),
+    }
+    for name, data in [('lexicon.json', lexicon), ('names.json', names), ('prefixes.json', prefixes)]:
+        with open(os.path.join(seg_dir, name), 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+
+def champion_postings(doc_ids, fields, lengths, avg_lengths, boosts):
+    """The CHAMPION_LIST_SIZE highest-impact (impact, doc id, fields) postings of a term under boosts, best first."""
+    impacts = []
+    for doc_id, postings in zip(doc_ids, fields):
+        doc_lengths = lengths[doc_id]
+        tf = 0.0
+        for field_idx, count in postings:
+            tf += boosts[field_idx] * count / field_norm(doc_lengths[field_idx], avg_lengths[field_idx])
+        impacts.append((tf, doc_id, postings))
+    return heapq.nlargest(CHAMPION_LIST_SIZE, impacts, key=lambda item: item[0])
+
+def encode_champions(top, out, lengths, avg_lengths, boosts):
+    """
+    Append a champion list in BLOCK_SIZE blocks of decreasing impact. Each
+    block holds its documents in doc order and decodes on its own (from doc id 0).
+
+    Returns:
+        tuple: (last doc id per block, block end offsets relative to the list's
+        start, per-block maxima as encode_blocked() returns them).
+    """
+    start = len(out)
+    last_docs = []
+    ends = []
+    block_max = []
+    for b in range(0, len(top), BLOCK_SIZE):
+        block = sorted(top[b:b + BLOCK_SIZE], key=lambda item: item[1])
+        block_last, _, maxima, _ = encode_blocked([doc_id for _, doc_id, _ in block],
+                                                  [postings for _, _, postings in block],
+                                                  out, lengths, avg_lengths, boosts)
+        last_docs.extend(block_last)
+        ends.append(len(out) - start)
+        block_max.extend(maxima)
+    return last_docs, ends, block_max
+
+def write_documents(seg_dir, docs):
+    """
+    Write the stored fields (one JSON [title, url, type] record per document)
+    with their offsets, and the field lengths as one flat array, for the
+    query side to memory-map.
+    """
+    offsets = array('Q', [0])
+    lengths = array('I')
+    with open(os.path.join(seg_dir, 'stored.bin'), 'wb') as f:
+        for title, url, node_type, doc_lengths in docs:
+            f.write(json.dumps([title, url, node_type], ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+            offsets.append(f.tell())
+            lengths.extend(doc_lengths)
+    with open(os.path.join(seg_dir, 'stored_offsets.bin'), 'wb') as f:
+        offsets.tofile(f)
+    with open(os.path.join(seg_dir, 'lengths.bin'), 'wb') as f:
+        lengths.tofile(f)
+
+# Query API
+
+class _Segment:
+    """Memory-mapped postings, skip and document files plus the JSON side files of one segment directory."""
+
+    def __init__(self, seg_dir):
+        def load(name):
+            with open(os.path.join(seg_dir, name), 'r', encoding='utf-8') as f:
+                return json.load(f)
+
+        lexicon = load('lexicon.json')
+        self.terms = lexicon['terms']
+        self.df = lexicon['df']
+        self.offsets = lexicon['offsets']
+        self.blocks = lexicon['blocks']
+        self.max_norm_tf = lexicon['max_norm_tf']
+        self.doc_count = lexicon['doc_count']
+        self.length_totals = lexicon['length_totals']
+        self.avg_lengths = lexicon['avg_lengths']
+        self.boosts = lexicon['boosts']
+        self.champions = {int(k): v for k, v in lexicon['champions'].items()}
+        self.term_ids = {t: i for i, t in enumerate(self.terms)}
+        names = load('names.json')
+        self.name_keys = [n[0] for n in names]
+        self.name_docs = [n[1] for n in names]
+        prefixes = load('prefixes.json')
+        self.name_prefixes = prefixes['names']
+        self.term_prefixes = prefixes['terms']
+        self._files = []
+        self._maps = []
+        self.postings = self._map(seg_dir, 'postings.bin')
+        self.block_max = memoryview(self._map(seg_dir, 'block_max.bin')).cast('d')
+        self.skip_docs = memoryview(self._map(seg_dir, 'skip_docs.bin')).cast('I')
+        self.skip_ends = memoryview(self._map(seg_dir, 'skip_ends.bin')).cast('I')
+        # Field lengths of document d at [d * len(FIELDS), (d + 1) * len(FIELDS))
+        self.lengths = memoryview(self._map(seg_dir, 'lengths.bin')).cast('I')
+        self.stored_data = self._map(seg_dir, 'stored.bin')
+        self.stored_offsets = memoryview(self._map(seg_dir, 'stored_offsets.bin')).cast('Q')
+
+    def _map(self, seg_dir, name):
+        f = open(os.path.join(seg_dir, name), 'rb')
+        self._files.append(f)
+        if not os.fstat(f.fileno()).st_size:
+            return b''
+        m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(m)
+        return m
+
+    def postings_list(self, term_id):
+        """(start offset, first block, block count) of a term's full postings."""
+        first = self.blocks[term_id]
+        return self.offsets[term_id], first, self.blocks[term_id + 1] - first
+
+    def champion_list(self, term_id):
+        """(start offset, first block, block count, lowest impact) of a term's champion list, or None."""
+        return self.champions.get(term_id)
+
+    def block(self, start, first, b, base):
+        """Decode block b of the postings list starting at start whose first block is first."""
+        lo = start + (self.skip_ends[b - 1] if b > first else 0)
+        return decode_block(self.postings[lo:start + self.skip_ends[b]], base)
+
+    def iter_blocks(self, term_id):
+        """Yield each block of a term's full postings as decode_block() returns it."""
+        start, first, count = self.postings_list(term_id)
+        for b in range(first, first + count):
+            yield self.block(start, first, b, self.skip_docs[b - 1] if b > first else 0)
+
+    def stored(self, doc_id):
+        """[title, url, type] of a document."""
+        return json.loads(self.stored_data[self.stored_offsets[doc_id]:self.stored_offsets[doc_id + 1]])
+
+    def document(self, doc_id):
+        """[title, url, type, field lengths] of a document, as write_segment() takes it."""
+        n = len(FIELDS)
+        return self.stored(doc_id) + [self.lengths[doc_id * n:(doc_id + 1) * n].tolist()]
+
+    def name_candidates(self, key, n):
+        """The n best name indices for key, shortest first, and whether more may exist beyond them."""
+        if key in self.name_prefixes and n <= SUGGEST_TABLE_SIZE:
+            ids = self.name_prefixes[key]
+            return ids[:n], len(ids) >= n
+        lo, hi = prefix_range(self.name_keys, key)
+        ids = heapq.nsmallest(n, range(lo, hi), key=lambda i: (len(self.name_keys[i]), i))
+        return ids, hi - lo > n
+
+    def prefix_terms(self, prefix):
+        """The PREFIX_TABLE_SIZE most frequent terms in this segment starting with prefix."""
+        ids = self.term_prefixes.get(prefix)
+        if ids is None:
+            ids = heapq.nsmallest(PREFIX_TABLE_SIZE, range(*prefix_range(self.terms, prefix)),
+                                  key=lambda i: (-self.df[i], i))
+        return [self.terms[i] for i in ids]
+
+    def term_max(self, term_id):
+        n = len(FIELDS) + 1
+        return self.max_norm_tf[term_id * n:(term_id + 1) * n]
+
+    def close(self):
+        for view in [self.skip_docs, self.skip_ends, self.block_max, self.lengths, self.stored_offsets]:
+            view.release()
+        for m in self._maps:
+            m.close()
+        for f in self._files:
+            f.close()
+
+class _Cursor:
+    """
+    Position in one term's postings for a query.
+
+    shallow() moves between blocks with the skip table alone; a block is only
+    decoded once a document in it has to be read. doc is the current document
+    when exact is set, otherwise a lower bound for it. Ids are offset by doc_base.
+    champion is the term's champion list in the segment, if it has one.
+    """
+
+    def __init__(self, index, segment, postings_list, idf, maxima, doc_base=0, champion=None):
+        self.index = index
+        self.seg = segment
+        self.start, self.first, count = postings_list
+        self.end = self.first + count
+        self.idf = idf
+        self.doc_base = doc_base
+        self.maxima = maxima
+        self.champion = champion
+        self.weights, self.impact_scale = index._bound_weights(segment, maxima)
+        self.ub = self._bound(maxima, 0)
+        self.rest = self.ub  # Bound on the scores _champion_top_k() has not read yet
+        self.block = self.first
+        self.loaded = -1
+        self.docs = []
+        self.columns = []
+        self.i = 0
+        self.block_ubs = {}
+        self.doc = doc_base
+        self.exact = not count
+        if not count:
+            self.doc = END
+
+    def shallow(self, target):
+        if target <= self.doc:
+            return
+        local = target - self.doc_base
+        if self.seg.skip_docs[self.block] < local:
+            self.block = bisect.bisect_left(self.seg.skip_docs, local, self.block + 1, self.end)
+            if self.block == self.end:
+                self.doc = END
+                self.exact = True
+                return
+        self.doc = target
+        self.exact = False
+
+    def materialize(self):
+        if self.loaded != self.block:
+            seg = self.seg
+            b = self.block
+            base = seg.skip_docs[b - 1] if b > self.first else 0
+            self.docs, self.columns = seg.block(self.start, self.first, b, base)
+            self.loaded = b
+            self.i = 0
+        local = self.doc - self.doc_base
+        if self.docs[self.i] < local:
+            self.i = bisect.bisect_left(self.docs, local, self.i + 1)
+        self.doc = self.docs[self.i] + self.doc_base
+        self.exact = True
+
+    def next(self):
+        """Step past the current document."""
+        self.i += 1
+        if self.i < len(self.docs):
+            self.doc = self.docs[self.i] + self.doc_base
+            return
+        self.block += 1
+        if self.block == self.end:
+            self.doc = END
+        else:
+            self.doc = self.seg.skip_docs[self.block - 1] + 1 + self.doc_base
+            self.exact = False
+
+    def probe(self, doc):
+        """The term's score for any doc, 0.0 if doc lacks it, leaving the cursor where it is."""
+        seg = self.seg
+        local = doc - self.doc_base
+        b = bisect.bisect_left(seg.skip_docs, local, self.first, self.end)
+        if b == self.end:
+            return 0.0
+        lo = self.start + (seg.skip_ends[b - 1] if b > self.first else 0)
+        fields = find_posting(seg.postings[lo:self.start + seg.skip_ends[b]],
+                              seg.skip_docs[b - 1] if b > self.first else 0, local)
+        if not fields:
+            return 0.0
+        boosts = self.index.boosts
+        avg_lengths = self.index.avg_lengths
+        lengths = seg.lengths
+        keep = 1 - B
+        at = local * len(FIELDS)
+        tf = 0.0
+        for field_idx, count in fields:
+            tf += boosts[field_idx] * count / (keep + B * lengths[at + field_idx] / avg_lengths[field_idx])
+        return self.idf * tf / (K1 + tf)
+
+    def champion_blocks(self):
+        """Block count of the term's champion list, or of its full postings if it has none."""
+        return self.champion[2] if self.champion else self.end - self.first
+
+    def read_champions(self, lo, hi):
+        """
+        Yield (doc ids, scores) for blocks lo to hi - 1 of the term's champion
+        list, or of its full postings if it has none.
+        """
+        seg = self.seg
+        if self.champion:
+            start, first, _, _ = self.champion
+        else:
+            start, first = self.start, self.first
+        for b in range(first + lo, first + hi):
+            base = 0 if self.champion or b == first else seg.skip_docs[b - 1]
+            docs, columns = seg.block(start, first, b, base)
+            yield [doc + self.doc_base for doc in docs], self.index._scores(seg, self.idf, docs, columns)
+
+    def champion_rest(self, read):
+        """Bound on the term's scores in this segment outside the first read blocks read_champions() yields."""
+        if not self.champion:
+            return 0.0 if read == self.end - self.first else self.ub
+        _, first, count, lowest = self.champion
+        n = len(FIELDS)
+        impact = self.seg.block_max[(first + read) * (n + 1) + n] if read < count else lowest
+        return self._bound(self.maxima[:n] + [impact], 0)
+
+    def block_last(self):
+        return END if self.block == self.end else self.seg.skip_docs[self.block] + self.doc_base
+
+    def _bound(self, maxima, offset):
+        tf = 0.0
+        for field_idx, weight in self.weights:
+            tf += weight * maxima[offset + field_idx]
+        if self.impact_scale:
+            tf = min(tf, self.impact_scale * maxima[offset + len(FIELDS)])
+        return self.idf * tf / (K1 + tf)
+
+    def block_ub(self):
+        ub = self.block_ubs.get(self.block)
+        if ub is None:
+            ub = self.block_ubs[self.block] = self._bound(self.seg.block_max, self.block * (len(FIELDS) + 1))
+        return ub
+
+    def score(self):
+        boosts = self.index.boosts
+        avg_lengths = self.index.avg_lengths
+        lengths = self.seg.lengths
+        keep = 1 - B
+        i = self.i
+        at = self.docs[i] * len(FIELDS)
+        tf = 0.0
+        for field_idx, column in self.columns:
+            count = column[i]
+            if count:
+                tf += boosts[field_idx] * count / (keep + B * lengths[at + field_idx] / avg_lengths[field_idx])
+        return self.idf * tf / (K1 + tf)
+
+    def accumulate(self, upto, scores):
+        """Add the scores of the current block's documents up to upto into scores and move past them."""
+        if not self.exact:
+            self.materialize()
+        start = self.i
+        stop = bisect.bisect_right(self.docs, upto - self.doc_base, start)
+        for doc, score in zip(self.docs[start:stop],
+                              self.index._scores(self.seg, self.idf, self.docs, self.columns, start, stop)):
+            doc += self.doc_base
+            scores[doc] = scores.get(doc, 0.0) + score
+        if stop < len(self.docs):
+            self.i = stop
+            self.doc = self.docs[stop] + self.doc_base
+        else:
+            self.i = stop - 1
+            self.next()
+
+class SearchIndex:
+    """
+    Read-only view over an index directory written by build_index(). The base
+    and delta segments share one doc id space, the delta's ids following the
+    base's; tombstoned base documents are skipped and left out of the
+    statistics, so scores are those of a single freshly built segment.
+    """
+
+    def __init__(self, index_dir=INDEX_DIR, boosts=None):
+        with open(os.path.join(index_dir, 'manifest.json'), 'r', encoding='utf-8') as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('version') != INDEX_VERSION:
+            raise ValueError(f"Unsupported search index version in {index_dir}: {self.manifest.get('version')}")
+        self.segments = [_Segment(os.path.join(index_dir, self.manifest['base']))]
+        self.dead = set()
+        self.dead_df = {}
+        if self.manifest['delta']:
+            delta_dir = os.path.join(index_dir, self.manifest['delta'])
+            self.segments.append(_Segment(delta_dir))
+            with open(os.path.join(delta_dir, 'tombstones.json'), 'r', encoding='utf-8') as f:
+                tombstones = json.load(f)
+            self.dead = set(tombstones['docs'])
+            self.dead_df = tombstones['df']
+        self.doc_bases = []
+        doc_count = 0
+        totals = [0] * len(FIELDS)
+        for seg in self.segments:
+            self.doc_bases.append(doc_count)
+            doc_count += seg.doc_count
+            totals = [t + n for t, n in zip(totals, seg.length_totals)]
+        # Tombstoned documents are base documents, whose ids come first
+        n = len(FIELDS)
+        lengths = self.segments[0].lengths
+        for doc_id in self.dead:
+            for i in range(n):
+                totals[i] -= lengths[doc_id * n + i]
+        self.doc_count = doc_count - len(self.dead)
+        self.avg_lengths = [t / self.doc_count if self.doc_count else 0.0 for t in totals]
+        self.boosts = [(boosts or FIELD_BOOSTS).get(f, 1.0) for f in self.manifest['fields']]
+        # Champion lists were picked under the build-time boosts and are only read for those
+        self.champions_usable = self.boosts == self.manifest['boosts']
+
+    def close(self):
+        for seg in self.segments:
+            seg.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _bound_weights(self, segment, maxima):
+        """
+        Turn a segment's stored maxima into score bounds for this index.
+
+        Returns (field_idx, weight) pairs for the per-field maxima, and the
+        scale for the stored impact, or 0 when the boosts differ from the
+        build-time ones and the impact does not apply. Both are scaled up where
+        the average field length now is larger than when the segment was
+        written, since norm(avg now) >= norm(avg then) * min(1, avg then / avg now).
+        """
+        weights = []
+        scale = 1.0
+        for field_idx, then in enumerate(segment.avg_lengths):
+            now = self.avg_lengths[field_idx]
+            growth = max(1.0, now / then) if then else 1.0
+            scale = max(scale, growth)
+            if maxima[field_idx]:
+                weights.append((field_idx, self.boosts[field_idx] * growth))
+        return weights, scale if self.boosts == segment.boosts else 0.0
+
+    def doc_freq(self, term):
+        """Live documents containing term."""
+        df = -self.dead_df.get(term, 0)
+        for seg in self.segments:
+            term_id = seg.term_ids.get(term)
+            if term_id is not None:
+                df += seg.df[term_id]
+        return df
+
+    def _cursors(self, term):
+        """One cursor per segment holding term."""
+        df = self.doc_freq(term)
+        if df <= 0:
+            return []
+        idf = math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+        cursors = []
+        for seg, doc_base in zip(self.segments, self.doc_bases):
+            term_id = seg.term_ids.get(term)
+            if term_id is not None:
+                cursors.append(_Cursor(self, seg, seg.postings_list(term_id), idf, seg.term_max(term_id), doc_base,
+                                       seg.champion_list(term_id)))
+        return cursors
+
+    def _scores(self, seg, idf, docs, columns, start=0, stop=None):
+        """
+        Scores of docs[start:stop], a decoded block of seg, column by column,
+        adding fields in the same order as _Cursor.score() so sums match exactly.
+        """
+        boosts = self.boosts
+        avg_lengths = self.avg_lengths
+        lengths = seg.lengths
+        n = len(FIELDS)
+        keep = 1 - B
+        docs = docs[start:stop]
+        tfs = [0.0] * len(docs)
+        for field_idx, column in columns:
+            boost = boosts[field_idx]
+            avg = avg_lengths[field_idx]
+            tfs = [tf + boost * count / (keep + B * lengths[doc * n + field_idx] / avg) if count else tf
+                   for tf, count, doc in zip(tfs, column[start:stop], docs)]
+        return [idf * tf / (K1 + tf) for tf in tfs]
+
+    def _champion_top_k(self, term_cursors, k):
+        """
+        Top k read from the champion lists first, in the manner of the
+        threshold algorithm.
+
+        Champion lists, best impacts first, and the full postings of terms too
+        rare to have one are read 1, 2, 4, ... blocks at a time. After each
+        round the documents met are completed on their other terms from the
+        full postings, best bound first, while their bound (scores so far plus
+        the other terms' bounds) can still beat the k-th score. Documents not
+        met yet are bounded by the impacts the champion lists have reached, and
+        once that bound also falls to the k-th score the top k is exact. Gives
+        up as soon as the lists' lowest impacts show that cannot happen, or
+        once CHAMPION_PROBES documents have been completed.
+
+        Args:
+            term_cursors (list): The full-postings cursors of each query term.
+
+        Returns:
+            tuple: ((score, -doc_id) heap, doc ids scored, whether the heap is the exact top k).
+        """
+        # Per segment, each term's cursor there or None
+        rows = {}
+        for term_idx, cursors in enumerate(term_cursors):
+            for c in cursors:
+                rows.setdefault(c.doc_base, [None] * len(term_cursors))[term_idx] = c
+        rows = list(rows.values())
+        # [term bit, cursor, row, blocks read]
+        streams = [[1 << term_idx, c, row, 0] for row in rows for term_idx, c in enumerate(row) if c is not None]
+        # Documents outside every champion list can score up to this, so the
+        # top k cannot be proven unless its k-th score reaches it
+        floor = max(sum(c.champion_rest(c.champion_blocks()) for c in row if c is not None) for row in rows)
+        heap = []
+        theta = 0.0
+        scored = set()
+        dead = self.dead
+        met = {}  # doc id -> [score so far, term bits read, row]
+        probes = 0
+        step = 1
+        while True:
+            for stream in streams:
+                bit, c, row, read = stream
+                count = c.champion_blocks()
+                if read == count:
+                    continue
+                # Full postings of a rare term are read at once
+                stop = min(count, read + step) if c.champion else count
+                for docs, scores in c.read_champions(read, stop):
+                    for doc, score in zip(docs, scores):
+                        if doc in scored or (dead and doc in dead):
+                            continue
+                        entry = met.get(doc)
+                        if entry is None:
+                            met[doc] = [score, bit, row]
+                        else:
+                            entry[0] += score
+                            entry[1] |= bit
+                stream[3] = stop
+                c.rest = c.champion_rest(stop)
+            step *= 2
+            exhausted = all(read == c.champion_blocks() for _, c, _, read in streams)
+            # Complete the documents met that can still make the top k, best bound first
+            bounds = {}
+            pending = []
+            for doc, (score, bits, row) in met.items():
+                rest = bounds.get((id(row), bits))
+                if rest is None:
+                    rest = bounds[id(row), bits] = sum(c.rest for term_idx, c in enumerate(row)
+                                                       if c is not None and not bits >> term_idx & 1)
+                if len(heap) < k or score + rest > theta:
+                    pending.append((score + rest, doc))
+            pending.sort(reverse=True)
+            for bound, doc in pending:
+                if len(heap) == k and bound <= theta:
+                    break
+                if exhausted and bound < floor and (len(heap) < k or theta < floor):
+                    return heap, scored, False
+                score, bits, row = met.pop(doc)
+                for term_idx, c in enumerate(row):
+                    if c is not None and c.rest and not bits >> term_idx & 1:
+                        score += c.probe(doc)
+                        probes += 1
+                scored.add(doc)
+                if len(heap) < k:
+                    heapq.heappush(heap, (score, -doc))
+                elif score > theta:
+                    heapq.heapreplace(heap, (score, -doc))
+                if len(heap) == k:
+                    theta = heap[0][0]
+                if probes >= CHAMPION_PROBES:
+                    return heap, scored, False
+            unseen = max(sum(c.rest for c in row if c is not None) for row in rows)
+            if not unseen or (len(heap) == k and unseen <= theta):
+                return heap, scored, True
+            if exhausted:
+                return heap, scored, False
+
+    def _approximate_top_k(self, term_cursors, k):
+        """Top k (score, doc_id) pairs by the scores in the champion lists alone (full postings of rarer terms)."""
+        totals = {}
+        for cursors in term_cursors:
+            for c in cursors:
+                for docs, scores in c.read_champions(0, c.champion_blocks()):
+                    for doc, score in zip(docs, scores):
+                        totals[doc] = totals.get(doc, 0.0) + score
+        dead = self.dead
+        return self._ranked(heapq.nlargest(k, ((score, -doc) for doc, score in totals.items() if doc not in dead)))
+
+    def _top_k(self, cursors, k, heap=None, scored=frozenset()):
+        """
+        Exact top k (score, doc_id) pairs by block-max MaxScore.
+
+        Cursors are ordered by score upper bound. Once k documents are held, the
+        low-bound cursors whose bounds sum to no more than the k-th score can no
+        longer introduce a document on their own: only the remaining (essential)
+        cursors are iterated, the others are probed for candidates that can still
+        make it. Stretches where the essential cursors' current blocks cannot
+        lift a document over the threshold are skipped without decoding.
+
+        heap and scored seed the search with the (score, -doc_id) heap and the
+        doc ids already scored by _champion_top_k().
+        """
+        heap = heap or []
+        if k <= 0 or not cursors:
+            return self._ranked(heap)
+        cursors.sort(key=lambda c: c.ub)
+        cum = list(itertools.accumulate(c.ub for c in cursors))
+        theta = heap[0][0] if len(heap) == k else 0.0
+        first = 0
+        while len(heap) == k and first < len(cursors) and cum[first] <= theta:
+            first += 1
+        essential = cursors[first:]
+        dead = self.dead.union(scored) if scored else self.dead
+
+        def offer(doc, score):
+            """Add the non-essential cursors' scores for doc and keep it if it makes the top k."""
+            nonlocal theta, first, essential
+            full = len(heap) == k
+            for j in range(first - 1, -1, -1):
+                if full and score + cum[j] <= theta:
+                    return
+                c = cursors[j]
+                c.shallow(doc)
+                if c.doc > doc:
+                    continue
+                if full and score + c.block_ub() + (cum[j - 1] if j else 0.0) <= theta:
+                    continue
+                c.materialize()
+                if c.doc == doc:
+                    score += c.score()
+            if not full:
+                heapq.heappush(heap, (score, -doc))
+            elif score > theta:
+                heapq.heapreplace(heap, (score, -doc))
+            else:
+                return
+            if len(heap) == k:
+                theta = heap[0][0]
+                while first < len(cursors) and cum[first] <= theta:
+                    first += 1
+                essential = cursors[first:]
+
+        while essential:
+            upto = min(c.block_last() for c in essential)
+            if upto >= END:
+                break
+            if len(heap) == k:
+                bound = cum[first - 1] if first else 0.0
+                for c in essential:
+                    if c.doc <= upto:
+                        bound += c.block_ub()
+                if bound <= theta:
+                    for c in essential:
+                        c.shallow(upto + 1)
+                    continue
+            # Score the essential cursors' documents up to the end of the shortest current block
+            scores = {}
+            for c in essential:
+                if c.doc <= upto:
+                    c.accumulate(upto, scores)
+            for doc in sorted(scores):
+                if dead and doc in dead:
+                    continue
+                score = scores[doc]
+                if len(heap) < k or score + (cum[first - 1] if first else 0.0) > theta:
+                    offer(doc, score)
+        return self._ranked(heap)
+
+    @staticmethod
+    def _ranked(heap):
+        """(score, doc_id) pairs of a (score, -doc_id) heap, best first."""
+        return sorted(((score, -neg) for score, neg in heap), key=lambda item: (-item[0], item[1]))
+
+    def expand_prefix(self, prefix, limit=PREFIX_EXPANSIONS, budget=PREFIX_POSTINGS_BUDGET):
+        """
+        Lexicon terms starting with prefix, most frequent first, while the
+        postings they add up to stay within budget. The prefix itself is kept
+        whenever it is a term.
+        """
+        df = {}
+        for seg in self.segments:
+            for term in seg.prefix_terms(prefix):
+                if term not in df:
+                    df[term] = self.doc_freq(term)
+        terms = []
+        cost = 0
+        if self.doc_freq(prefix) > 0:
+            terms.append(prefix)
+            cost = self.doc_freq(prefix)
+        for term in sorted(df, key=lambda t: (-df[t], t)):
+            if len(terms) >= limit:
+                break
+            if term == prefix or not df[term] or cost + df[term] > budget:
+                continue
+            terms.append(term)
+            cost += df[term]
+        return terms
+
+    def search(self, query, limit=10, prefix=False, approximate=False):
+        """
+        Rank documents for a free-text query with BM25F.
+
+        Args:
+            query (str): Query text.
+            limit (int): Max results to return.
+            prefix (bool): Treat the last query token as a prefix (autocomplete).
+            approximate (bool): Rank by the champion lists of frequent terms
+                alone. Faster, but documents outside a term's champion list get
+                no score for it; ignored when the boosts differ from the ones
+                the champion lists were built with.
+
+        Returns:
+            list: dicts with title, url, type and score, best first.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        terms = []
+        for i, token in enumerate(tokens):
+            for term in self.expand_prefix(token) if prefix and i == len(tokens) - 1 else [token]:
+                if term not in terms:
+                    terms.append(term)
+        term_cursors = [cursors for cursors in map(self._cursors, terms) if cursors]
+        cursors = [c for cursors in term_cursors for c in cursors]
+        champions = limit > 0 and self.champions_usable
+        if champions and approximate and any(c.champion for c in cursors):
+            top = self._approximate_top_k(term_cursors, limit)
+        elif champions and cursors and all(any(c.champion for c in cursors) for cursors in term_cursors):
+            # Only worth it when every term is frequent: MaxScore skips most of
+            # a frequent term's postings once a rarer term sets the threshold
+            heap, scored, exact = self._champion_top_k(term_cursors, limit)
+            # Otherwise finish from the full postings, skipping the documents already scored
+            top = self._ranked(heap) if exact else self._top_k(cursors, limit, heap, scored)
+        else:
+            top = self._top_k(cursors, limit)
+        return [self._result(doc_id, score) for score, doc_id in top]
+
+    def suggest(self, prefix, limit=10):
+        """Autocomplete titles and aliases that start with prefix, shortest first."""
+        key = normalize(prefix).strip()
+        if not key or limit <= 0:
+            return []
+        want = limit * 2
+        while True:
+            candidates, truncated = self._name_candidates(key, want)
+            # A title and its aliases count once
+            results = []
+            seen = set()
+            for doc_id in candidates:
+                if doc_id in seen or doc_id in self.dead:
+                    continue
+                seen.add(doc_id)
+                results.append(self._result(doc_id))
+                if len(results) >= limit:
+                    return results
+            if not truncated:
+                return results
+            want *= 4
+
+    def _name_candidates(self, key, n):
+        """Doc ids of the n best names for key over all segments and whether more may exist beyond them."""
+        candidates = []
+        truncated = False
+        for seg, doc_base in zip(self.segments, self.doc_bases):
+            ids, more = seg.name_candidates(key, n)
+            truncated = truncated or more
+            candidates.extend((len(seg.name_keys[i]), seg.name_keys[i], seg.name_docs[i] + doc_base) for i in ids)
+        candidates.sort()
+        return [doc_id for _, _, doc_id in candidates[:n]], truncated or len(candidates) > n
+
+    def _result(self, doc_id, score=None):
+        s = bisect.bisect_right(self.doc_bases, doc_id) - 1
+        title, url, node_type = self.segments[s].stored(doc_id - self.doc_bases[s])
+        result = {'title': title, 'url': url, 'type': node_type}
+        if score is not None:
+            result['score'] = round(score, 4)
+        return result
+
+# Meilisearch export
+
+def meili_id(key):
+    # Meilisearch ids may only contain a-z A-Z 0-9 - and _
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]
+
+def export_meilisearch(out_path, enriched_csv=ENRICHED_CSV):
+    """Write enriched rows as a Meilisearch documents array (POST /indexes/<uid>/documents)."""
+    count = 0
+    with open(enriched_csv, 'r', encoding='utf-8') as infile, \
+         open(out_path, 'w', encoding='utf-8') as outfile:
+        outfile.write('[\n')
+        for row in csv.DictReader(infile):
+            key = doc_key(row)
+            if not key:
+                continue
+            doc = {
+                'id': meili_id(key),
+                'title': row.get('title') or '',
+                'url': row.get('url') or '',
+                'type': row.get('type') or '',
+                'summary': row.get('summary') or '',
+            }
+            for field in ['aliases', 'tags', 'topic']:
+                val = safe_parse(row.get(field) or '[]')
+                doc[field] = [v for v in val if isinstance(v, str)] if isinstance(val, list) else []
+            if count:
+                outfile.write(',\n')
+            outfile.write(json.dumps(doc, ensure_ascii=False))
+            count += 1
+        outfile.write('\n]\n')
+    print(f"Exported {count} documents for Meilisearch to {out_path}")
+    return count
+
+def main():
+    parser = argparse.ArgumentParser(description='Build and query the local search index.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('build', help='Build or incrementally refresh the index')
+    p.add_argument('--enriched', default=ENRICHED_CSV)
+    p.add_argument('--articles', default=ARTICLES_DIR)
+    p.add_argument('--out', default=INDEX_DIR)
+    p.add_argument('--full', action='store_true', help='Ignore the previous build and re-tokenize everything')
+    p.add_argument('--compact', choices=['background', 'inline', 'never'], default='background',
+                   help='How to merge the delta segment into the base once it has grown')
+    p = sub.add_parser('compact', help='Merge the delta segment into the base segment')
+    p.add_argument('--index', default=INDEX_DIR)
+    p = sub.add_parser('query', help='Run a ranked query')
+    p.add_argument('text')
+    p.add_argument('--index', default=INDEX_DIR)
+    p.add_argument('--limit', type=int, default=10)
+    p.add_argument('--prefix', action='store_true', help='Treat the last token as a prefix')
+    p.add_argument('--approximate', action='store_true', help='Read champion lists for frequent terms')
+    p = sub.add_parser('suggest', help='Autocomplete titles and aliases')
+    p.add_argument('text')
+    p.add_argument('--index', default=INDEX_DIR)
+    p.add_argument('--limit', type=int, default=10)
+    p = sub.add_parser('export-meili', help='Export a Meilisearch documents file')
+    p.add_argument('out')
+    p.add_argument('--enriched', default=ENRICHED_CSV)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        build_index(args.enriched, args.articles, args.out, full=args.full, compact_mode=args.compact)
+    elif args.command == 'compact':
+        compact(args.index)
+    elif args.command == 'export-meili':
+        export_meilisearch(args.out, args.enriched)
+    else:
+        with SearchIndex(args.index) as index:
+            start = time.perf_counter()
+            if args.command == 'query':
+                results = index.search(args.text, limit=args.limit, prefix=args.prefix,
+                                       approximate=args.approximate)
+            else:
+                results = index.suggest(args.text, limit=args.limit)
+            elapsed = (time.perf_counter() - start) * 1000
+            for r in results:
+                score = f"{r['score']:8.3f}  " if 'score' in r else ''
+                print(f"{score}{r['title']} [{r['type']}] {r['url']}")
+            print(f"{len(results)} results in {elapsed:.2f} ms", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()